@@ -1,21 +1,29 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from collections import Counter
-import re
 import asyncio
-from googletrans import Translator 
-import gtts
+import io
 import os
-import time
+import locale
 import logging
 import pygame
-import genanki
-import random
 import pyperclip
 import sys
 import subprocess
-import inspect
 import shutil
+from word_counting import INPUT_LANGS, rank_words, WordCountEngine, FrequencyIndexCache
+from translation import BatchTranslator, LocalDictionaryBackend, TranslationCache, TARGET_LANG_MAP, TRANSLATION_MAX_IN_FLIGHT, translate_in_window
+from speech import AudioCache, AudioPrefetcher, ClipMemoryCache, GTTSBackend, EspeakBackend
+from media_processing import DEFAULT_MEDIA_BITRATE, DEFAULT_MEDIA_CODEC, find_ffmpeg, process_deck_media, format_media_report
+from results_store import ResultsStore
+from results_view import VirtualResultsView
+from ui_updates import UIUpdateDispatcher
+from results_filter import ResultsFilterIndex, FilterSearch, SortedHits, MATCH_PREFIX, MATCH_SUBSTRING
+from anki_export import EXPORT_TYPES, generate_deck_audio, StreamingPackageWriter, ExportManifest, audio_fingerprint
+import multiprocessing
+
+SPEAK_LOOKAHEAD = 3 # Words synthesized ahead of the one playing during Speak All
+SPEAK_CHECK_MS = 15 # Mixer poll interval during Speak All, i.e. the longest gap between words
+SORT_HEADINGS = {"Word": "word", "Count": "count", "Translation": "translation"} # Table heading -> ResultsStore sort column
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -49,9 +57,20 @@ class WordCounterApp:
         self.file_label.grid(row=0, column=0, columnspan=6, sticky="w", pady=(0,10))
 
         self.file_paths = []
+        self.word_count_engine = WordCountEngine(cache=FrequencyIndexCache())
         self.translator = None
+        self.translation_cache = self._open_translation_cache()
+        self.tts_backend = GTTSBackend()
+        self.audio_cache = None
+        self.audio_prefetcher = None
         try:
-            self.translator = Translator()
+            self.audio_cache = AudioCache(backend=self.tts_backend)
+            self.audio_prefetcher = AudioPrefetcher(self.audio_cache)
+        except Exception as e:
+            logging.warning(f"Audio cache unavailable, audio will be synthesized on every use: {e}")
+        self.clip_memory = ClipMemoryCache(self.audio_cache, backend=self.tts_backend)
+        try:
+            self.translator = BatchTranslator(cache=self.translation_cache)
         except Exception as e:
             logging.error(f"Failed to initialize Translator: {e}")
             messagebox.showerror("Translator Error", f"Failed to initialize Google Translator: {e}")
@@ -65,8 +84,7 @@ class WordCounterApp:
         language_label = ttk.Label(frame, text="Input Lang:")
         language_label.grid(row=1, column=2, sticky="w", padx=(5,0))
         self.language_var = tk.StringVar(value="en")
-        lang_options = ["en", "ar", "de", "es", "fr", "it", "pt", "tr", "nl", "he", "ja", "ko", "ru", "zh-cn", "sv", "pl", "fi", "el", "hi", "id"]
-        self.language_menu = ttk.OptionMenu(frame, self.language_var, "en", *lang_options)
+        self.language_menu = ttk.OptionMenu(frame, self.language_var, "en", *INPUT_LANGS)
         self.language_menu.grid(row=1, column=3, sticky="ew", padx=2)
 
         translation_label = ttk.Label(frame, text="Translate To:")
@@ -75,7 +93,7 @@ class WordCounterApp:
         trans_options = ["None", "English", "Arabic", "German", "Spanish", "French", "Italian", "Portuguese"]
         self.translation_menu = ttk.OptionMenu(frame, self.translation_var, "None", *trans_options)
         self.translation_menu.grid(row=1, column=5, sticky="ew", padx=2)
-        self.translation_var.trace_add("write", lambda *args: self.start_processing_files() if self.file_paths and not self.is_processing else None)
+        self.translation_var.trace_add("write", lambda *args: self.start_processing_files() if self.file_paths and not self.is_processing and not self.is_exporting else None)
 
         self.word_limit_label = ttk.Label(frame, text="Word Limit:")
         self.word_limit_label.grid(row=2, column=0, sticky="w", pady=5, padx=2)
@@ -95,53 +113,181 @@ class WordCounterApp:
         export_label = ttk.Label(frame, text="Export As:")
         export_label.grid(row=3, column=0, sticky="w", pady=5, padx=2)
         self.export_var = tk.StringVar(value="word_front_translation_back")
-        export_options = [
-            "word_front_translation_back", "translation_front_word_back",
-            "word_front_speech_back", "translation_front_speech_word_back",
-            "word_front_speech_translation_back"
-        ]
-        self.export_menu = ttk.OptionMenu(frame, self.export_var, export_options[0], *export_options)
+        self.export_menu = ttk.OptionMenu(frame, self.export_var, EXPORT_TYPES[0], *EXPORT_TYPES)
         self.export_menu.grid(row=3, column=1, columnspan=3, sticky="ew", pady=5, padx=2)
         
         self.export_button = ttk.Button(frame, text="Export Anki Deck", command=self.export_anki_deck)
         self.export_button.grid(row=3, column=4, columnspan=2, sticky="ew", pady=5, padx=2)
 
+        backend_label = ttk.Label(frame, text="Translator:")
+        backend_label.grid(row=4, column=0, sticky="w", pady=5, padx=2)
+        self.translation_backend_var = tk.StringVar(value="Google")
+        self.translation_backend_menu = ttk.OptionMenu(frame, self.translation_backend_var, "Google", "Google", "Offline Dictionary",
+                                                       command=self.change_translation_backend)
+        self.translation_backend_menu.grid(row=4, column=1, sticky="ew", pady=5, padx=2)
+
+        tts_backend_label = ttk.Label(frame, text="Speech:")
+        tts_backend_label.grid(row=4, column=2, sticky="w", pady=5, padx=(5,0))
+        self.tts_backend_var = tk.StringVar(value="Google TTS")
+        self.tts_backend_menu = ttk.OptionMenu(frame, self.tts_backend_var, "Google TTS", "Google TTS", "espeak-ng (offline)",
+                                               command=self.change_tts_backend)
+        self.tts_backend_menu.grid(row=4, column=3, sticky="ew", pady=5, padx=2)
+
+        self.prefetch_audio_var = tk.BooleanVar(value=False)
+        self.prefetch_audio_check = ttk.Checkbutton(frame, text="Pre-generate audio", variable=self.prefetch_audio_var,
+                                                    command=self.toggle_audio_prefetch)
+        self.prefetch_audio_check.grid(row=5, column=0, columnspan=2, sticky="w", pady=5, padx=2)
+        if not self.audio_prefetcher: self.prefetch_audio_check.state(["disabled"])
+
+        self.compress_audio_var = tk.BooleanVar(value=False)
+        self.compress_audio_check = ttk.Checkbutton(frame, text="Compress deck audio", variable=self.compress_audio_var)
+        self.compress_audio_check.grid(row=5, column=2, columnspan=2, sticky="w", pady=5, padx=(5,0))
+        if not find_ffmpeg(): self.compress_audio_check.state(["disabled"]) # Needs ffmpeg on PATH
+
+        self.speak_pause_button = ttk.Button(frame, text="Pause", command=self.toggle_speak_pause, state="disabled")
+        self.speak_pause_button.grid(row=5, column=4, sticky="ew", pady=5, padx=2)
+        self.speak_skip_button = ttk.Button(frame, text="Skip", command=self.skip_spoken_word, state="disabled")
+        self.speak_skip_button.grid(row=5, column=5, sticky="ew", pady=5, padx=2)
+
         self.progress_bar = ttk.Progressbar(frame, orient="horizontal", length=200, mode="determinate")
-        self.progress_bar.grid(row=4, column=0, columnspan=6, sticky="ew", pady=(10,5))
-
-        self.result_tree = ttk.Treeview(frame, columns=("Word", "Count", "Translation", "Speak"), show="headings")
-        self.result_tree.heading("Word", text="Word")
-        self.result_tree.heading("Count", text="Count")
-        self.result_tree.heading("Translation", text="Translation")
-        self.result_tree.heading("Speak", text="Speak")
-        self.result_tree.column("Word", width=150, stretch=tk.YES)
-        self.result_tree.column("Count", width=60, stretch=tk.NO, anchor="center")
-        self.result_tree.column("Translation", width=200, stretch=tk.YES)
-        self.result_tree.column("Speak", width=60, stretch=tk.NO, anchor="center")
-        self.result_tree.grid(row=5, column=0, columnspan=6, sticky="nsew", pady=(0,5))
+        self.progress_bar.grid(row=6, column=0, columnspan=6, sticky="ew", pady=(10,5))
+
+        filter_label = ttk.Label(frame, text="Filter:")
+        filter_label.grid(row=7, column=0, sticky="w", pady=5, padx=2)
+        self.filter_var = tk.StringVar()
+        self.filter_entry = ttk.Entry(frame, textvariable=self.filter_var)
+        self.filter_entry.grid(row=7, column=1, columnspan=2, sticky="ew", pady=5, padx=2)
+        self.filter_mode_var = tk.StringVar(value="Starts with")
+        self.filter_mode_menu = ttk.OptionMenu(frame, self.filter_mode_var, "Starts with", "Starts with", "Contains")
+        self.filter_mode_menu.grid(row=7, column=3, sticky="ew", pady=5, padx=2)
+        count_range_frame = ttk.Frame(frame)
+        count_range_frame.grid(row=7, column=4, columnspan=2, sticky="ew", pady=5, padx=2)
+        ttk.Label(count_range_frame, text="Count:").pack(side="left")
+        self.filter_min_count_var = tk.StringVar()
+        self.filter_min_count_entry = ttk.Entry(count_range_frame, width=7, textvariable=self.filter_min_count_var)
+        self.filter_min_count_entry.pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Label(count_range_frame, text="to").pack(side="left")
+        self.filter_max_count_var = tk.StringVar()
+        self.filter_max_count_entry = ttk.Entry(count_range_frame, width=7, textvariable=self.filter_max_count_var)
+        self.filter_max_count_entry.pack(side="left", fill="x", expand=True, padx=2)
+        for var in (self.filter_var, self.filter_mode_var, self.filter_min_count_var, self.filter_max_count_var):
+            var.trace_add("write", lambda *args: self.apply_filter())
+
+        self.results = ResultsStore() # What the table shows; the view only renders it (item id = row index)
+        self.results_view = VirtualResultsView(frame, self.results, on_scroll=self._schedule_visible_prefetch)
+        self.results_view.grid(row=8, column=0, columnspan=6, pady=(0,5))
+        self.result_tree = self.results_view.tree
         self.result_tree.bind("<ButtonRelease-1>", self.treeview_click)
         self.result_tree.bind("<Control-c>", self.copy_selected_words)
-
-        self.vsb = ttk.Scrollbar(frame, orient="vertical", command=self.result_tree.yview)
-        self.vsb.grid(row=5, column=6, sticky="ns")
-        self.result_tree.configure(yscrollcommand=self.vsb.set)
+        for heading, column in SORT_HEADINGS.items():
+            self.result_tree.heading(heading, command=lambda column=column: self.sort_results(column))
 
         for i in range(6): frame.columnconfigure(i, weight=1)
-        frame.rowconfigure(5, weight=1)
+        frame.rowconfigure(8, weight=1)
 
         self.is_processing = False
+        self.is_exporting = False
+        self.is_loading_dictionary = False
         self.words_to_process_list = []
+        self.ui_updates = UIUpdateDispatcher(self.root) # Pipeline progress and new rows reach the screen once per frame
+        self.filter_index = None # Built once per processing run, when it finishes
+        self.filter_search = None
+        self._filter_job_id = None
+        self._sort_job_id = None # Separate from the search's job, so sorting never cancels a search
+        self._set_filter_enabled(False)
+        self.sort_column = None # None = rank order, as the rows were added
+        self.sort_descending = False
         self.current_processing_index = 0
         self.total_words_for_progress = 0
         self.processed_count = 0
-        self.target_lang_map = {"english": "en", "arabic": "ar", "german": "de", "spanish": "es", "french": "fr", "italian": "it", "portuguese": "pt"}
+        self.target_lang_map = TARGET_LANG_MAP
         self.current_target_lang_name = ""
         self.current_target_lang_code = ""
+        self.current_source_lang = "auto"
+        self.translation_max_in_flight = TRANSLATION_MAX_IN_FLIGHT
         self.words_to_speak_queue = []
         self._speak_job_id = None
+        self.speak_position = -1
+        self.speak_paused = False
+        self._speak_clips = {}
+        self._speak_session = 0
+        self._awaiting_clip = None # (session, position) whose clip future already has a play callback
+        self._prefetch_job_id = None
+        self._playing_buffer = None
         self.loop_manager = None
 
 
+    def _open_translation_cache(self):
+        try:
+            return TranslationCache()
+        except Exception as e:
+            logging.warning(f"Translation cache unavailable, every word will be sent to the translator: {e}")
+            return None
+
+    def _current_backend_choice(self):
+        if self.translator and isinstance(self.translator.backend, LocalDictionaryBackend): return "Offline Dictionary"
+        return "Google"
+
+    def change_translation_backend(self, choice):
+        if self.is_processing or self.is_loading_dictionary:
+            messagebox.showinfo("Busy", "Cannot change the translator while processing or indexing a dictionary.")
+            self.translation_backend_var.set(self._current_backend_choice())
+            return
+        try:
+            if choice == "Offline Dictionary":
+                path = filedialog.askopenfilename(title="Select Bilingual Word List",
+                                                  filetypes=(("Word lists", "*.tsv *.txt *.ifo *.adidx"), ("All files", "*.*")))
+                if not path:
+                    self.translation_backend_var.set(self._current_backend_choice())
+                    return
+                self.is_loading_dictionary = True
+                self.root.config(cursor="watch")
+                asyncio.ensure_future(self.load_offline_dictionary(path), loop=self.loop)
+            else:
+                self.translator = BatchTranslator(cache=self.translation_cache)
+        except Exception as e:
+            logging.error(f"Could not switch translator to '{choice}': {e}")
+            messagebox.showerror("Translator Error", f"Could not switch translator:\n{e}")
+            self.translation_backend_var.set(self._current_backend_choice())
+
+    async def load_offline_dictionary(self, path):
+        # The first use of a word list builds its index, which takes a while for a
+        # large StarDict file; the current translator stays in place until it is ready.
+        try:
+            backend = await asyncio.to_thread(LocalDictionaryBackend, path)
+            self.translator = BatchTranslator(backend=backend)
+            logging.info(f"Using offline dictionary '{path}' ({len(backend.index)} entries).")
+        except Exception as e:
+            logging.error(f"Could not open offline dictionary '{path}': {e}")
+            messagebox.showerror("Translator Error", f"Could not switch translator:\n{e}")
+            self.translation_backend_var.set(self._current_backend_choice())
+        finally:
+            self.is_loading_dictionary = False
+            self.root.config(cursor="")
+
+    def _current_tts_choice(self):
+        return "espeak-ng (offline)" if isinstance(self.tts_backend, EspeakBackend) else "Google TTS"
+
+    def change_tts_backend(self, choice):
+        if self.is_exporting:
+            messagebox.showinfo("Busy", "Cannot change the speech engine while exporting.")
+            self.tts_backend_var.set(self._current_tts_choice())
+            return
+        try:
+            backend = EspeakBackend() if choice == "espeak-ng (offline)" else GTTSBackend()
+        except Exception as e:
+            logging.error(f"Could not switch speech engine to '{choice}': {e}")
+            messagebox.showerror("Speech Error", f"Could not switch speech engine:\n{e}")
+            self.tts_backend_var.set(self._current_tts_choice())
+            return
+        if self.words_to_speak_queue: self.stop_speaking()
+        if self.audio_prefetcher: self.audio_prefetcher.clear()
+        self.tts_backend = backend
+        if self.audio_cache: self.audio_cache.backend = backend # Clips are keyed by backend, so both engines' clips stay cached
+        self.clip_memory = ClipMemoryCache(self.audio_cache, backend=backend)
+        logging.info(f"Speech engine: {backend.name}.")
+        if self.prefetch_audio_var.get(): self.toggle_audio_prefetch()
+
     def browse_files(self):
         if self.is_processing:
             messagebox.showinfo("Busy", "Cannot browse files while processing.")
@@ -162,154 +308,65 @@ class WordCounterApp:
     async def _translate_words_batch(self, words_batch, target_lang_code):
         if not self.translator or not words_batch:
             return [""] * len(words_batch)
-        
-        original_indices_map = {} 
-        non_empty_words = []
-        for i, word in enumerate(words_batch):
-            if word and str(word).strip():
-                original_indices_map[len(non_empty_words)] = i
-                non_empty_words.append(str(word))
-        
-        translated_results = [""] * len(words_batch)
-
-        if not non_empty_words:
-            return translated_results
-
-        try:
-            for attempt in range(3):
-                try:
-                    logging.debug(f"Attempting batch translation for {len(non_empty_words)} words (attempt {attempt+1}).")
-                    
-                    translation_call_result = await asyncio.to_thread(
-                        self.translator.translate, non_empty_words, dest=target_lang_code
-                    )
-
-                    if inspect.iscoroutine(translation_call_result):
-                        logging.warning("asyncio.to_thread returned a coroutine for batch translate. Awaiting it.")
-                        translation_objs = await translation_call_result
-                    else:
-                        translation_objs = translation_call_result
-
-                    if not isinstance(translation_objs, list):
-                        logging.error(f"Batch translation (after potential await) did not return a list. Got: {type(translation_objs)}. Attempting re-init.")
-                        raise ValueError("Translator returned non-list for batch.")
-
-                    all_items_translated_successfully = True
-                    for i, trans_obj in enumerate(translation_objs):
-                        original_batch_idx = original_indices_map[i] 
-                        
-                        if inspect.iscoroutine(trans_obj): 
-                            logging.warning(f"Individual item in batch result is a coroutine for '{non_empty_words[i]}'. Awaiting.")
-                            try:
-                                actual_item_result = await trans_obj
-                                if hasattr(actual_item_result, 'text'):
-                                    translated_results[original_batch_idx] = actual_item_result.text
-                                else:
-                                    logging.warning(f"Awaited item for '{non_empty_words[i]}' lacks .text. Type: {type(actual_item_result)}")
-                                    translated_results[original_batch_idx] = "Item Error (No Text)"
-                                    all_items_translated_successfully = False
-                            except Exception as e_await_item:
-                                logging.error(f"Error awaiting individual item coroutine '{non_empty_words[i]}': {e_await_item}")
-                                translated_results[original_batch_idx] = "Item Await Error"
-                                all_items_translated_successfully = False
-                        elif trans_obj and hasattr(trans_obj, 'text'):
-                            translated_results[original_batch_idx] = trans_obj.text
-                        else: 
-                            logging.warning(f"Batch translation item for '{non_empty_words[i]}' is problematic. Type: {type(trans_obj)}, Value: {trans_obj}")
-                            translated_results[original_batch_idx] = "Item Invalid"
-                            all_items_translated_successfully = False
-                    
-                    if all_items_translated_successfully:
-                        return translated_results 
-                    else:
-                        logging.warning(f"Not all items translated successfully in attempt {attempt+1}. Retrying batch.")
-                        raise ValueError("Partial success in batch, retrying.")
-
-                except (AttributeError, ValueError) as e_val_attr: 
-                    logging.warning(f"Error during batch processing (attempt {attempt+1}): {e_val_attr}. Re-initializing translator.")
-                    try:
-                        self.translator = Translator() 
-                    except Exception as e_init_trans:
-                        logging.error(f"Failed to re-initialize translator: {e_init_trans}")
-                        for orig_idx in original_indices_map.values(): translated_results[orig_idx] = "Translator Re-init Err"
-                        return translated_results 
-                    await asyncio.sleep(1 * (attempt + 1)) 
-
-                except Exception as e_general: 
-                    logging.error(f"General batch translation error (attempt {attempt+1}) for '{target_lang_code}': {e_general}")
-                    if "TooManyRequests" in str(e_general) or "429" in str(e_general):
-                        await asyncio.sleep(3 * (attempt + 1)) 
-                    else:
-                        await asyncio.sleep(1.5 * (attempt + 1))
-            
-            logging.error(f"All {attempt+1} translation attempts failed for a batch.")
-            for orig_idx in original_indices_map.values():
-                if not translated_results[orig_idx]: 
-                     translated_results[orig_idx] = "Translation Failed"
-            return translated_results
-
-        except Exception as e_outer: 
-            logging.critical(f"CRITICAL error in _translate_words_batch structure: {e_outer}", exc_info=True)
-            for orig_idx in original_indices_map.values():
-                translated_results[orig_idx] = "Critical Error"
-            return translated_results
-
-    def _extract_words(self, text, lang_code):
-        logging.debug(f"Extracting words from text for language: {lang_code}")
-        if lang_code in ["zh-cn", "ja", "ko"]:
-            cjk_chars = r'\u2E80-\u2FFF\u3040-\u309F\u30A0-\u30FF\u31F0-\u31FF\u3200-\u32FF\u3400-\u4DBF\u4E00-\u9FFF\uAC00-\uD7AF\uF900-\uFAFF'
-            mixed_pattern = rf'[{cjk_chars}a-zA-Z0-9]+'
-            potential_words = re.findall(mixed_pattern, text)
-        else:
-            potential_words = re.split(r'\s+', text)
-        
-        min_len = 1 if lang_code in ["zh-cn", "ja", "ko"] else 2
-        words = [
-            word.lower()
-            for word in potential_words 
-            if word and len(word.strip()) >= min_len and not word.strip().isdigit()
-        ]
-        logging.debug(f"Extracted {len(words)} words. First few: {words[:10]}")
-        return words
+        return await self.translator.translate_batch(words_batch, target_lang_code, self.current_source_lang)
 
     def start_processing_files(self):
         if self.is_processing:
             messagebox.showinfo("Info", "Processing is already in progress.")
             return
+        if self.is_exporting:
+            messagebox.showinfo("Busy", "Cannot process files while exporting.")
+            return
+        if self.is_loading_dictionary:
+            messagebox.showinfo("Busy", "The offline dictionary is still being indexed. Try again in a moment.")
+            return
         if not self.file_paths:
             messagebox.showinfo("Info","No file(s) selected. Please select files first.")
             return
 
         self.is_processing = True
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
+        self.ui_updates.cancel()
+        if self.audio_prefetcher: self.audio_prefetcher.clear()
+        self.filter_index = None
+        self.filter_search = None
+        self._cancel_filter_jobs()
+        self._set_filter_enabled(False)
+        self.sort_column = None
+        self._update_sort_headings()
+        self.results.clear()
+        self.results_view.clear()
         
         self.progress_bar["value"] = 0
         self.progress_bar["maximum"] = 100 
         self.root.update_idletasks()
 
-        all_words = []
         current_input_lang = self.language_var.get()
         try:
-            for index, path in enumerate(self.file_paths):
-                with open(path, "r", encoding="utf-8") as file: text = file.read()
-                words = self._extract_words(text, current_input_lang)
-                all_words.extend(words)
-                self.progress_bar["value"] = int(((index + 1) / len(self.file_paths)) * 20)
-                self.root.update_idletasks()
+            asyncio.ensure_future(self.count_words_and_process(list(self.file_paths), current_input_lang), loop=self.loop)
+        except RuntimeError as e:
+            logging.critical(f"CRITICAL: Failed to schedule word counting: {e}", exc_info=True)
+            messagebox.showerror("Critical Async Error", "Could not schedule background tasks. Please restart.")
+            self.is_processing = False
+
+    def on_file_counted(self, path, files_done, total_files):
+        logging.info(f"Counted words in '{os.path.basename(path)}' ({files_done}/{total_files}).")
+        progress = int((files_done / total_files) * 20)
+        self.ui_updates.schedule("progress", lambda: self.progress_bar.configure(value=progress))
+
+    async def count_words_and_process(self, paths, current_input_lang):
+        try:
+            word_counts = await self.word_count_engine.count_files_async(paths, current_input_lang, self.on_file_counted)
         except Exception as e:
             logging.error(f"Could not process files: {e}")
             messagebox.showerror("Error", f"Could not process files:\n{e}")
             self.is_processing = False
             return
+        self.ui_updates.flush() # Counting progress lands before the bar is reset below
 
-        if not all_words:
+        if not word_counts:
             messagebox.showinfo("Info", "No words extracted from the selected files.")
             self.progress_bar["value"] = 100; self.is_processing = False; self.root.update_idletasks(); return
             
-        word_counts = Counter(all_words)
-        sorted_words_with_counts = word_counts.most_common()
-
         try: 
             word_limit = int(self.word_limit_entry.get())
             word_limit = max(0, word_limit)
@@ -317,7 +374,7 @@ class WordCounterApp:
             messagebox.showerror("Error", "Invalid word limit. Using 0 (no limit).")
             word_limit = 0
         
-        self.words_to_process_list = sorted_words_with_counts[:word_limit] if word_limit > 0 else sorted_words_with_counts
+        self.words_to_process_list = rank_words(word_counts, word_limit)
         
         if not self.words_to_process_list:
             messagebox.showinfo("Info", "No words to display/translate based on limit.")
@@ -329,6 +386,7 @@ class WordCounterApp:
         self.progress_bar["value"] = 0
         self.processed_count = 0
 
+        self.current_source_lang = current_input_lang
         self.current_target_lang_name = self.translation_var.get().lower()
         self.current_target_lang_code = self.target_lang_map.get(self.current_target_lang_name, "None")
 
@@ -337,102 +395,195 @@ class WordCounterApp:
         self.current_processing_index = 0
         if self.loop_manager:
             self.loop_manager.schedule_async_processing() 
-        self.process_next_word_batch()
-
+        await self.process_word_batches()
 
-    def process_next_word_batch(self, batch_size=30): 
-        if not self.is_processing or self.current_processing_index >= self.total_words_for_progress:
-            if self.is_processing: self.finish_processing()
-            return
-
-        start_idx = self.current_processing_index
-        end_idx = min(start_idx + batch_size, self.total_words_for_progress)
-        current_batch_data = self.words_to_process_list[start_idx:end_idx]
-
-        if not current_batch_data:
-            self.finish_processing(); return
-
-        words_only_batch = [str(item[0]) for item in current_batch_data]
-        counts_batch = [item[1] for item in current_batch_data]
-        
-        try:
-            asyncio.ensure_future(self.translate_batch_and_update_ui(words_only_batch, counts_batch), loop=self.loop)
-        except RuntimeError as e:
-             logging.error(f"RuntimeError creating task: {e}", exc_info=True)
-             try: 
-                 current_loop_for_task = asyncio.get_event_loop()
-                 asyncio.ensure_future(self.translate_batch_and_update_ui(words_only_batch, counts_batch), loop=current_loop_for_task)
-             except Exception as e2:
-                 logging.critical(f"CRITICAL: Failed to schedule async task: {e2}", exc_info=True)
-                 messagebox.showerror("Critical Async Error", "Could not schedule background tasks. Please restart.")
-                 self.finish_processing() 
-                 return
-        self.current_processing_index = end_idx
-
-    async def translate_batch_and_update_ui(self, words_batch, counts_batch):
-        translations_batch = [""] * len(words_batch)
+    async def _translate_for_display(self, words_batch):
         if self.current_target_lang_code != "None" and self.translator:
-            translations_batch = await self._translate_words_batch(words_batch, self.current_target_lang_code)
-        
-        for i in range(len(words_batch)):
-            word = words_batch[i]
-            count = counts_batch[i]
-            translation = translations_batch[i]
-            self.result_tree.insert("", "end", values=(word, count, translation, "🔊"))
+            return await self._translate_words_batch(words_batch, self.current_target_lang_code)
+        return [""] * len(words_batch)
 
+    async def process_word_batches(self):
+        # Up to translation_max_in_flight batches are translated at once; batches are
+        # still handed to the UI in frequency order.
+        words = [str(item[0]) for item in self.words_to_process_list]
+        try:
+            await translate_in_window(self._translate_for_display, words, self.display_translated_batch,
+                                      max_in_flight=self.translation_max_in_flight)
+        except Exception as e:
+            logging.error(f"Error while translating words: {e}", exc_info=True)
+            messagebox.showerror("Error", f"Could not translate words:\n{e}")
+        self.finish_processing()
+
+    def display_translated_batch(self, start_idx, words_batch, translations_batch):
+        if not self.is_processing: return
+        counts = [self.words_to_process_list[start_idx + i][1] for i in range(len(words_batch))]
+        self.results.append_rows(words_batch, counts, translations_batch) # The store takes rows at once; the table catches up on the next frame
+        self.ui_updates.schedule("rows", self.results_view.rows_appended)
+
+        if self.prefetch_audio_var.get() and self.audio_prefetcher:
+            lang = self.language_var.get() # Same language speak_word plays in
+            for i, word in enumerate(words_batch):
+                self.audio_prefetcher.enqueue(word, lang, start_idx + i) # Rank order = frequency order
+            self._schedule_visible_prefetch()
+
+        self.current_processing_index = start_idx + len(words_batch)
         self.processed_count += len(words_batch)
         self.processed_count = min(self.processed_count, self.total_words_for_progress)
-        
+        self.ui_updates.schedule("progress", self._show_processing_progress)
+
+    def _show_processing_progress(self):
         self.progress_bar["value"] = self.processed_count
-        
-        if self.current_processing_index < self.total_words_for_progress and self.is_processing:
-            self.root.after(100, self.process_next_word_batch) 
-        elif self.is_processing:
-            self.finish_processing() 
-        self.root.update_idletasks() 
 
 
     def finish_processing(self):
         if not self.is_processing: return 
+        self.ui_updates.flush()
         self.progress_bar["value"] = self.processed_count 
         self.root.update_idletasks()
         messagebox.showinfo("Processing Complete", f"Displayed {self.processed_count} of {self.total_words_for_progress} targeted words.")
         logging.info("File processing and display complete.")
+        if self.translator: logging.info(f"Translation stats: {self.translator.stats()}")
         self.is_processing = False
+        asyncio.ensure_future(self.build_filter_index(), loop=self.loop)
 
-
-    def text_to_speech(self, text, lang='en', filename='output.mp3'):
-        if not text or not str(text).strip(): logging.warning("TTS: empty text."); return None
+    async def build_filter_index(self):
+        words = self.results.words # Replaced, not mutated, when the next run starts
         try:
-            logging.debug(f"gTTS: text='{text}', lang='{lang}', file='{filename}'")
-            tts = gtts.gTTS(text=str(text), lang=lang)
-            tts.save(filename)
-            logging.info(f"Audio saved to {filename}")
-            return filename
+            index = await asyncio.to_thread(ResultsFilterIndex, self.results)
         except Exception as e:
-            logging.error(f"Error during gTTS speech generation for '{text}': {e}")
-            if "No text to send" in str(e) and (not text or not str(text).strip()):
-                return None
-            return None
-
-    def play_audio(self, filename):
+            logging.error(f"Could not build the results filter index: {e}", exc_info=True)
+            return
+        if self.is_processing or self.results.words is not words: return # A new run started meanwhile
+        self.filter_index = index
+        logging.info(f"Filter index ready for {index.size} words.")
+        self._set_filter_enabled(True)
+        self.apply_filter()
+
+    def _set_filter_enabled(self, enabled):
+        for widget in (self.filter_entry, self.filter_mode_menu, self.filter_min_count_entry, self.filter_max_count_entry):
+            widget.state(["!disabled"] if enabled else ["disabled"])
+
+    def _filter_count_bound(self, var):
+        try: return int(var.get())
+        except ValueError: return None # Blank or not a number: no bound
+
+    def apply_filter(self):
+        # Runs on every keystroke; the search itself is sliced over frames by _continue_filter.
+        self._cancel_filter_jobs()
+        if not self.filter_index: return
+        min_count = self._filter_count_bound(self.filter_min_count_var)
+        max_count = self._filter_count_bound(self.filter_max_count_var)
+        if not self.filter_var.get().strip() and min_count is None and max_count is None:
+            self.filter_search = None
+            self._update_view_order()
+            return
+        mode = MATCH_SUBSTRING if self.filter_mode_var.get() == "Contains" else MATCH_PREFIX
+        self.filter_search = FilterSearch(self.filter_index, self.filter_var.get(), mode, min_count, max_count, previous=self.filter_search)
+        self._continue_filter(first_slice=True)
+
+    def _continue_filter(self, first_slice=False):
+        self._filter_job_id = None
+        done = self.filter_search.run()
+        if done or not self.sort_column: # Partial hits are shown as they come only when they need no sorting
+            self._update_view_order(keep_position=not first_slice)
+        if not done: self._filter_job_id = self.root.after(1, self._continue_filter)
+
+    def _cancel_filter_jobs(self):
+        if self._filter_job_id: self.root.after_cancel(self._filter_job_id)
+        if self._sort_job_id: self.root.after_cancel(self._sort_job_id)
+        self._filter_job_id = self._sort_job_id = None
+
+    def _update_view_order(self, keep_position=False):
+        # The view shows the filter's hits (or every row), in the chosen sort order.
+        if self._sort_job_id:
+            self.root.after_cancel(self._sort_job_id)
+            self._sort_job_id = None
+        rows = self.filter_search.rows if self.filter_search else None
+        if self.sort_column:
+            order = self.results.sort_order(self.sort_column, self.sort_descending)[0]
+            if rows is not None:
+                if not self.filter_search.done: return # _continue_filter sorts the hits once the search finishes
+                self._continue_sorted_hits(SortedHits(order, rows, len(self.results)), keep_position)
+                return
+            rows = order
+        self.results_view.set_order(rows, keep_position)
+
+    def _continue_sorted_hits(self, sorted_hits, keep_position=True):
+        # Sliced over frames like the search; rows come out in final order, so partial results are shown.
+        self._sort_job_id = None
+        done = sorted_hits.run()
+        self.results_view.set_order(sorted_hits.rows, keep_position)
+        if not done: self._sort_job_id = self.root.after(1, self._continue_sorted_hits, sorted_hits)
+
+    def sort_results(self, column):
+        if self.is_processing or not len(self.results): return
+        if column == self.sort_column: self.sort_descending = not self.sort_descending
+        else: self.sort_column, self.sort_descending = column, column == "count" # Most frequent first
+        self._update_sort_headings()
+        asyncio.ensure_future(self._apply_sort(self.sort_column, self.sort_descending), loop=self.loop)
+
+    async def _apply_sort(self, column, descending):
+        # The first sort of a column builds its permutation off the UI thread; later ones are cached.
+        words = self.results.words
+        await asyncio.to_thread(self.results.sort_order, column, descending)
+        if (self.sort_column, self.sort_descending) != (column, descending) or self.results.words is not words: return
+        self._update_view_order()
+
+    def _update_sort_headings(self):
+        for heading, column in SORT_HEADINGS.items():
+            arrow = "" if column != self.sort_column else (" ▼" if self.sort_descending else " ▲")
+            self.result_tree.heading(heading, text=heading + arrow)
+
+
+    def toggle_audio_prefetch(self):
+        if not self.audio_prefetcher: return
+        if not self.prefetch_audio_var.get():
+            self.audio_prefetcher.clear()
+            return
+        lang = self.language_var.get()
+        for rank, word in enumerate(self.results.words):
+            self.audio_prefetcher.enqueue(word, lang, rank)
+        self._schedule_visible_prefetch()
+
+    def _schedule_visible_prefetch(self):
+        # Debounced, so scrolling or a burst of inserted batches costs one pass.
+        if not self.prefetch_audio_var.get() or not self.audio_prefetcher or self._prefetch_job_id: return
+        self._prefetch_job_id = self.root.after(150, self._prefetch_visible_rows)
+
+    def _prefetch_visible_rows(self):
+        # Rows on screen jump ahead of the frequency-ordered backlog.
+        self._prefetch_job_id = None
+        lang = self.language_var.get()
+        for position, row in enumerate(self.results_view.visible_rows()):
+            self.audio_prefetcher.enqueue(self.results.words[row], lang, -1000000 + position)
+
+    def play_audio(self, clip):
+        # clip is either encoded mp3 bytes (played from memory) or a file path.
         if not pygame.mixer.get_init():
             logging.warning("Pygame mixer not initialized. Attempting to re-initialize.")
             try: pygame.mixer.init()
             except pygame.error as e: 
                 logging.error(f"Failed to re-initialize pygame mixer: {e}")
                 messagebox.showerror("Audio Error", f"Pygame mixer is not available: {e}")
-                return
-        if not filename or not os.path.exists(filename):
-            logging.error(f"Audio file not found: {filename}")
-            return
+                return False
+        from_memory = isinstance(clip, (bytes, bytearray))
+        if not clip or (not from_memory and not os.path.exists(clip)):
+            logging.error(f"Audio file not found: {clip}")
+            return False
+        clip_name = "in-memory clip" if from_memory else os.path.basename(clip)
         try:
-            logging.info(f"Playing audio: {filename}")
-            pygame.mixer.music.load(filename)
+            logging.info(f"Playing audio: {clip_name}")
+            if from_memory:
+                self._playing_buffer = io.BytesIO(clip) # pygame streams from it, so it must outlive the call
+                pygame.mixer.music.load(self._playing_buffer, self.clip_memory.backend.extension.lstrip("."))
+            else:
+                pygame.mixer.music.load(clip)
             pygame.mixer.music.play()
+            return True
         except pygame.error as e:
-            logging.error(f"Error during pygame audio playback for {filename}: {e}")
-            messagebox.showerror("Playback Error", f"Could not play audio '{os.path.basename(filename)}':\n{e}")
+            logging.error(f"Error during pygame audio playback for {clip_name}: {e}")
+            messagebox.showerror("Playback Error", f"Could not play audio '{clip_name}':\n{e}")
+            return False
 
     def treeview_click(self, event):
         if self.is_processing: return 
@@ -441,113 +592,135 @@ class WordCounterApp:
             item_id = self.result_tree.identify_row(event.y)
             column_idx = self.result_tree.identify_column(event.x)
             if column_idx == '#4' and item_id: 
-                values = self.result_tree.item(item_id)['values']
-                if values and len(values) > 0:
-                    self.speak_word(str(values[0]))
+                self.speak_word(self.results.words[int(item_id)])
 
     def speak_word(self, word_to_speak):
         word_to_speak_str = str(word_to_speak).strip()
         if not word_to_speak_str: return
         
-        temp_audio_dir = "temp_audio_files"; os.makedirs(temp_audio_dir, exist_ok=True)
-        safe_fn = re.sub(r'[^\w\s-]', '', word_to_speak_str).strip().replace(' ', '_') or "audio"
-        output_file = os.path.join(temp_audio_dir, f"{safe_fn}_{int(time.time()*1000)}.mp3") 
-        
-        audio_file = self.text_to_speech(word_to_speak_str, self.language_var.get(), output_file)
-        if audio_file: self.play_audio(audio_file)
+        clip = self.clip_memory.get_or_create(word_to_speak_str, self.language_var.get())
+        if clip: self.play_audio(clip)
     
     def speak_all_words(self):
         if self.is_processing:
             messagebox.showinfo("Busy", "Cannot speak all words while processing files.")
             return
-        
-        if self._speak_job_id:
-            self.root.after_cancel(self._speak_job_id)
-            self._speak_job_id = None
-        self.words_to_speak_queue.clear()
+        if self.words_to_speak_queue:
+            self.stop_speaking()
+            return
 
-        visible_items = self.result_tree.get_children()
-        for item_id in visible_items:
-            item_values = self.result_tree.item(item_id)['values']
-            if item_values and len(item_values) > 0:
-                self.words_to_speak_queue.append(str(item_values[0]))
+        self.words_to_speak_queue.extend(self.results.words[row] for row in self.results_view.rows())
 
         if not self.words_to_speak_queue: messagebox.showinfo("Info", "No words in the list to speak."); return
-        
-        self._speak_next_from_queue()
 
-    def _speak_next_from_queue(self):
-        if not self.words_to_speak_queue:
+        self._speak_session += 1
+        self.speak_paused = False
+        self.speak_all_button.config(text="Stop Speaking")
+        self.speak_pause_button.config(text="Pause", state="normal")
+        self.speak_skip_button.config(state="normal")
+        self._play_spoken_word(0)
+
+    def _prepare_spoken_words(self, from_position):
+        # Clips are synthesized on worker threads a few words ahead, so the next one is
+        # usually ready by the time the current one ends.
+        lang = self.language_var.get()
+        for position in range(from_position, min(from_position + SPEAK_LOOKAHEAD + 1, len(self.words_to_speak_queue))):
+            if position not in self._speak_clips:
+                self._speak_clips[position] = self.loop.run_in_executor(
+                    None, self.clip_memory.get_or_create, self.words_to_speak_queue[position], lang)
+
+    def _play_spoken_word(self, position):
+        if position >= len(self.words_to_speak_queue):
             logging.info("Finished speaking all words from queue.")
-            self._speak_job_id = None
+            self.stop_speaking()
             return
-        
-        if pygame.mixer.get_init() and pygame.mixer.music.get_busy():
-            self._speak_job_id = self.root.after(200, self._speak_next_from_queue)
+        self.speak_position = position
+        for old_position in [p for p in self._speak_clips if p < position]: del self._speak_clips[old_position]
+        self._prepare_spoken_words(position)
+        clip_future = self._speak_clips[position]
+        if not clip_future.done():
+            waiting_for = (self._speak_session, position)
+            if self._awaiting_clip == waiting_for: return # Resume/skip while synthesizing: the callback below will play it
+            self._awaiting_clip = waiting_for
+            def on_clip_ready(_):
+                if self._awaiting_clip != waiting_for: return
+                self._awaiting_clip = None
+                if self.speak_position == position: self._play_spoken_word(position)
+            clip_future.add_done_callback(on_clip_ready)
+            return
+        clip = None if clip_future.cancelled() or clip_future.exception() else clip_future.result()
+        if not clip:
+            logging.warning(f"Skipping '{self.words_to_speak_queue[position]}': no audio.")
+            self._play_spoken_word(position + 1)
+            return
+        if self.speak_paused: return # Resumed by toggle_speak_pause
+        if not self.play_audio(clip):
+            self.stop_speaking()
             return
+        if self._speak_job_id: self.root.after_cancel(self._speak_job_id) # Only ever one polling chain
+        self._speak_job_id = self.root.after(SPEAK_CHECK_MS, self._check_spoken_word_finished)
 
-        word_to_speak = self.words_to_speak_queue.pop(0)
-        self.speak_word(word_to_speak)
-        
-        delay_ms = 1000 + len(word_to_speak) * 80 
-        self._speak_job_id = self.root.after(delay_ms, self._speak_next_from_queue)
+    def _check_spoken_word_finished(self):
+        # Advances once the mixer goes idle. pygame's end-of-track event would need SDL's
+        # video subsystem inside the Tk process, which conflicts with Tk on macOS.
+        self._speak_job_id = None
+        if not self.speak_paused:
+            if not (pygame.mixer.get_init() and pygame.mixer.music.get_busy()):
+                self._play_spoken_word(self.speak_position + 1)
+                return
+        self._speak_job_id = self.root.after(SPEAK_CHECK_MS, self._check_spoken_word_finished)
+
+    def toggle_speak_pause(self):
+        if not self.words_to_speak_queue: return
+        self.speak_paused = not self.speak_paused
+        self.speak_pause_button.config(text="Resume" if self.speak_paused else "Pause")
+        if not pygame.mixer.get_init(): return
+        if self.speak_paused: pygame.mixer.music.pause()
+        elif self._speak_job_id: pygame.mixer.music.unpause()
+        else: self._play_spoken_word(self.speak_position) # Paused before this clip had started
+
+    def skip_spoken_word(self):
+        if not self.words_to_speak_queue: return
+        if self._speak_job_id:
+            self.root.after_cancel(self._speak_job_id)
+            self._speak_job_id = None
+        self.speak_paused = False
+        self.speak_pause_button.config(text="Pause")
+        self._play_spoken_word(self.speak_position + 1)
+
+    def stop_speaking(self):
+        if self._speak_job_id:
+            self.root.after_cancel(self._speak_job_id)
+            self._speak_job_id = None
+        self._speak_session += 1
+        self._awaiting_clip = None
+        for clip_future in self._speak_clips.values(): clip_future.cancel()
+        self._speak_clips.clear()
+        self.words_to_speak_queue.clear()
+        self.speak_position = -1
+        self.speak_paused = False
+        if pygame.mixer.get_init(): pygame.mixer.music.stop()
+        self.speak_all_button.config(text="Speak All Visible")
+        self.speak_pause_button.config(text="Pause", state="disabled")
+        self.speak_skip_button.config(state="disabled")
 
 
     def export_anki_deck(self):
         if self.is_processing:
             messagebox.showinfo("Busy", "Cannot export while processing files.")
             return
-        if not self.result_tree.get_children():
+        if self.is_exporting:
+            messagebox.showinfo("Busy", "An export is already in progress.")
+            return
+        if not len(self.results):
             messagebox.showerror("Error", "No words to export. Please process files first.")
             return
 
         deck_name = self.deck_name_entry.get().strip()
         if not deck_name: messagebox.showerror("Error", "Please enter a deck name."); return
         
-        model_name = "Vocabulary Card Model (Autoplay Audio)"
         export_type = self.export_var.get()
 
-        model_id = random.randrange(1 << 30, 1 << 31)
-        deck_id = random.randrange(1 << 30, 1 << 31)
-
-        fields = [{"name": "Front"}, {"name": "Back"}]
-        if "speech" in export_type: fields.append({"name": "Audio"})
-
-        qfmt = '<div style="text-align: center; font-size: 24px;"><b>{{Front}}</b></div>'
-        afmt_parts = [
-            '<div style="text-align: center; font-size: 20px;">{{Front}}</div>',
-            '<hr id="answer">',
-            '<div style="text-align: center; font-size: 22px; margin-top:10px;">{{Back}}</div>'
-        ]
-        if "speech" in export_type:
-            afmt_parts.extend(['{{#Audio}}',
-                               '<div id="anki-audio-player" style="text-align: center; margin-top:15px;">{{Audio}}</div>',
-                               '''<script>
-                                   var audioContainer = document.getElementById("anki-audio-player");
-                                   if (audioContainer) {
-                                       var audioEle = audioContainer.querySelector("audio");
-                                       if (audioEle && audioEle.paused) {
-                                           var playPromise = audioEle.play();
-                                           if (playPromise !== undefined) {
-                                               playPromise.catch(error => { console.log("Autoplay prevented: " + error); });
-                                           }
-                                       }
-                                   }
-                               </script>''',
-                               '{{/Audio}}'])
-        
-        model_css = (".card { font-family: Arial, sans-serif; background-color: #F0F0F0; color: #333; } "
-                     "hr#answer { border-top: 1px solid #CCC; margin: 10px 0; } "
-                     ".nightMode .card { background-color: #333; color: #F0F0F0; } "
-                     ".nightMode hr#answer { border-top: 1px solid #555; }"
-                     "#anki-audio-player audio { max-width: 100%; }")
-
-        model = genanki.Model(model_id, model_name, fields=fields, 
-                              templates=[{"name": "Card 1", "qfmt": qfmt, "afmt": "\n".join(afmt_parts)}],
-                              css=model_css)
-        deck = genanki.Deck(deck_id, deck_name)
-        package = genanki.Package(deck)
-
         filepath = filedialog.asksaveasfilename(defaultextension=".apkg", 
                                                filetypes=[("Anki Package", "*.apkg")],
                                                title="Save Anki Deck As", initialfile=f"{deck_name}.apkg")
@@ -561,68 +734,104 @@ class WordCounterApp:
                 return
             os.makedirs(audio_dir_selected, exist_ok=True)
 
-        items_to_export = self.result_tree.get_children()
-        total_items = len(items_to_export)
-        self.progress_bar["value"] = 0; self.progress_bar["maximum"] = total_items; self.progress_bar.update()
-        media_filenames_added = set()
+        rows = self.results.export_rows()
 
-        for index, item_id in enumerate(items_to_export):
-            raw_values = self.result_tree.item(item_id)['values']
-            word = str(raw_values[0])
-            translation = str(raw_values[2]) if len(raw_values) > 2 else ""
-            
-            front_content, back_content, audio_anki_tag = "", "", ""
-            
-            safe_fn_base = re.sub(r'[^\w-]', '', word).strip().replace(' ', '_')
-            if not safe_fn_base: safe_fn_base = f"audio_{index}"
-            unique_suffix = str(random.randint(10000, 99999)) 
-            audio_mp3_fn = f"{safe_fn_base}_{unique_suffix}.mp3"
+        manifest = ExportManifest(deck_name)
+        changed_only = False
+        if manifest.entries:
+            changed_count = manifest.count_changed(rows, export_type)
+            if 0 < changed_count < len(rows):
+                changed_only = messagebox.askyesno("Incremental Export",
+                    f"{len(rows) - changed_count} of {len(rows)} notes are unchanged since the last export of '{deck_name}'.\n\n"
+                    f"Export only the {changed_count} new or changed note(s)? Choose No to export the full deck.")
 
-            if "speech" in export_type and audio_dir_selected:
-                full_audio_path = os.path.join(audio_dir_selected, audio_mp3_fn)
-                gen_path = self.text_to_speech(word, self.language_var.get(), full_audio_path)
-                if gen_path and os.path.exists(gen_path):
-                    audio_anki_tag = f"[sound:{audio_mp3_fn}]"
-                    if audio_mp3_fn not in media_filenames_added:
-                        package.media_files.append(gen_path)
-                        media_filenames_added.add(audio_mp3_fn)
-                else: logging.warning(f"Audio generation/finding failed for '{word}'")
-
-            if export_type == "word_front_translation_back": front_content, back_content = word, translation
-            elif export_type == "translation_front_word_back": front_content, back_content = translation, word
-            elif export_type == "word_front_speech_back": front_content, back_content = word, "" 
-            elif export_type == "translation_front_speech_word_back": front_content, back_content = translation, word
-            elif export_type == "word_front_speech_translation_back": front_content, back_content = word, translation
-            
-            note_fields = [front_content, back_content]
-            if "speech" in export_type: note_fields.append(audio_anki_tag)
-            deck.add_note(genanki.Note(model=model, fields=note_fields))
-            
-            if index % 5 == 0 or index == total_items -1 : 
-                self.progress_bar["value"] = index + 1
-                self.root.update_idletasks()
+        self.is_exporting = True
+        try:
+            asyncio.ensure_future(self.export_anki_deck_async(deck_name, export_type, filepath, audio_dir_selected, rows,
+                                                              manifest, changed_only), loop=self.loop)
+        except RuntimeError as e:
+            logging.critical(f"CRITICAL: Failed to schedule export: {e}", exc_info=True)
+            messagebox.showerror("Critical Async Error", "Could not schedule background tasks. Please restart.")
+            self.is_exporting = False
+
+    async def export_anki_deck_async(self, deck_name, export_type, filepath, audio_dir_selected, rows, manifest, changed_only=False):
+        # Audio is generated on a worker pool while the window stays responsive; the
+        # notes are assembled in row order once every clip is ready. Clips the
+        # manifest shows were already made the same way are reused, not regenerated.
+        try:
+            total_items = len(rows)
+            self.progress_bar["value"] = 0; self.progress_bar["maximum"] = total_items; self.progress_bar.update()
 
-        self.progress_bar["value"] = total_items; self.progress_bar.update()
+            def on_audio_progress(done, total):
+                self.progress_bar["value"] = done
 
-        try:
-            package.write_to_file(filepath)
-            messagebox.showinfo("Success", f"Anki deck '{os.path.basename(filepath)}' exported successfully!")
+            media_report = None
+            audio_failures = []
+            compress_audio = self.compress_audio_var.get()
+            audio_key = None
+            if "speech" in export_type and audio_dir_selected:
+                audio_key = audio_fingerprint(self.language_var.get(), self.tts_backend,
+                                              f"{DEFAULT_MEDIA_CODEC}:{DEFAULT_MEDIA_BITRATE}" if compress_audio else "")
+            rows, audio_paths, missing_audio = manifest.plan(rows, export_type, audio_key, changed_only)
             try:
-                if os.name == 'nt': os.startfile(os.path.dirname(filepath))
-                elif sys.platform == 'darwin': subprocess.run(['open', os.path.dirname(filepath)], check=False)
-                else: subprocess.run(['xdg-open', os.path.dirname(filepath)], check=False)
-            except Exception as e_open: logging.warning(f"Could not open explorer: {e_open}")
-        except Exception as e:
-            logging.error(f"Error writing Anki package: {e}")
-            messagebox.showerror("Export Error", f"Could not generate Anki Deck:\n{e}")
-        
-        self.progress_bar["value"] = 0; self.progress_bar.update()
+                # The package is written as the export runs: clips go into the zip as
+                # they finish (after compression when that is on), notes in batches.
+                writer = await asyncio.to_thread(StreamingPackageWriter, filepath, deck_name, export_type)
+                try:
+                    if missing_audio:
+                        self.progress_bar["maximum"] = len(missing_audio)
+                        new_paths, audio_failures = await generate_deck_audio([rows[index][0] for index in missing_audio], self.language_var.get(),
+                                                                              audio_dir_selected, on_audio_progress, audio_cache=self.audio_cache,
+                                                                              tts_backend=self.tts_backend,
+                                                                              on_clip_ready=None if compress_audio else writer.add_media)
+                        if compress_audio and any(new_paths):
+                            self.progress_bar["value"] = 0
+                            try:
+                                new_paths, media_report = await process_deck_media(new_paths, on_progress=on_audio_progress)
+                            except Exception as e:
+                                logging.error(f"Audio compression skipped: {e}")
+                        for index, path in zip(missing_audio, new_paths): audio_paths[index] = path
+
+                    self.progress_bar["value"] = 0; self.progress_bar["maximum"] = len(rows)
+                    def on_notes_progress(done, total): # Called on the writer's thread
+                        self.loop.call_soon_threadsafe(on_audio_progress, done, total)
+                    await asyncio.to_thread(writer.add_rows, rows, audio_paths if audio_key else None, on_notes_progress)
+                    await asyncio.to_thread(writer.close)
+                except BaseException:
+                    writer.abort()
+                    raise
+                manifest.record(rows, export_type, audio_paths, audio_key)
+                if audio_key:
+                    row_of_word = {word: row for row, word in enumerate(self.results.words)}
+                    self.results.set_audio([row_of_word[word] for word, _ in rows], audio_paths)
+                await asyncio.to_thread(manifest.save)
+                self.progress_bar["value"] = len(rows); self.progress_bar.update()
+
+                message = f"Anki deck '{os.path.basename(filepath)}' exported successfully!"
+                if changed_only: message += f"\n\n{len(rows)} new or changed note(s) written."
+                if media_report: message += f"\n\nAudio compression: {format_media_report(media_report)}"
+                if audio_failures:
+                    failed_words = ", ".join(word for word, _ in audio_failures[:10])
+                    if len(audio_failures) > 10: failed_words += ", ..."
+                    message += f"\n\nAudio could not be generated for {len(audio_failures)} word(s): {failed_words}"
+                messagebox.showinfo("Success", message)
+                try:
+                    if os.name == 'nt': os.startfile(os.path.dirname(filepath))
+                    elif sys.platform == 'darwin': subprocess.run(['open', os.path.dirname(filepath)], check=False)
+                    else: subprocess.run(['xdg-open', os.path.dirname(filepath)], check=False)
+                except Exception as e_open: logging.warning(f"Could not open explorer: {e_open}")
+            except Exception as e:
+                logging.error(f"Error writing Anki package: {e}")
+                messagebox.showerror("Export Error", f"Could not generate Anki Deck:\n{e}")
+        finally:
+            self.is_exporting = False
+            self.progress_bar["value"] = 0; self.progress_bar.update()
 
     def copy_selected_words(self, event=None):
         if self.is_processing: return
-        selected_items = self.result_tree.selection()
-        if selected_items:
-            words_to_copy = [str(self.result_tree.item(item)['values'][0]) for item in selected_items]
+        selected_rows = sorted(self.results_view.selected_rows)
+        if selected_rows:
+            words_to_copy = [self.results.words[row] for row in selected_rows]
             try:
                 pyperclip.copy("\n".join(words_to_copy))
                 messagebox.showinfo("Copied", f"{len(words_to_copy)} word(s) copied to clipboard.")
@@ -774,6 +983,9 @@ async def main_shutdown_sequence(event_loop, tk_root, loop_mgr):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    try: locale.setlocale(locale.LC_COLLATE, "") # Word sorting follows the user's locale
+    except locale.Error: pass
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     
@@ -838,6 +1050,8 @@ if __name__ == "__main__":
                 root_tk.destroy()
     finally:
         logging.info("Tkinter mainloop has exited.")
+        app_instance.word_count_engine.shutdown()
+        if app_instance.audio_prefetcher: app_instance.audio_prefetcher.stop()
         # If shutdown flag is not set, it means an abrupt exit not via WM_DELETE or KeyboardInterrupt
         # that was handled. We should try to run the shutdown sequence.
         if not _is_shutting_down_flag and main_event_loop and not main_event_loop.is_closed():
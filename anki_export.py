@@ -0,0 +1,343 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+from genanki.package import APKG_COL, APKG_SCHEMA
+import genanki
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from media_processing import store_media_by_content
+from rate_limiting import AdaptiveRateLimiter
+from speech import GTTSBackend, TTSThrottled
+from word_counting import DEFAULT_CACHE_DIR
+
+MODEL_NAME = "Vocabulary Card Model (Autoplay Audio)"
+EXPORT_TYPES = [
+    "word_front_translation_back", "translation_front_word_back",
+    "word_front_speech_back", "translation_front_speech_word_back",
+    "word_front_speech_translation_back"
+]
+EXPORT_TTS_WORKERS = 4
+TTS_MAX_ATTEMPTS = 3
+APKG_NOTE_BATCH_SIZE = 2000 # Notes per collection transaction
+EXPORT_MANIFEST_DIR = os.path.join(DEFAULT_CACHE_DIR, "exports")
+
+
+def stable_id(*parts):
+    # Deterministic id in genanki's usual [2**30, 2**31) range, so re-exports update
+    # the same deck and note type in Anki instead of creating new ones.
+    digest = hashlib.sha1("\0".join(parts).encode("utf-8")).digest()
+    return (1 << 30) + int.from_bytes(digest[:4], "big") % (1 << 30)
+
+# One note type for every export type: Anki skips notes whose note type changed,
+# so a re-export in another format must keep the model (and its fields) fixed.
+MODEL_ID = stable_id(MODEL_NAME)
+
+
+def build_note_model(model_id=MODEL_ID):
+    fields = [{"name": "Front"}, {"name": "Back"}, {"name": "Audio"}]
+
+    qfmt = '<div style="text-align: center; font-size: 24px;"><b>{{Front}}</b></div>'
+    afmt_parts = [
+        '<div style="text-align: center; font-size: 20px;">{{Front}}</div>',
+        '<hr id="answer">',
+        '<div style="text-align: center; font-size: 22px; margin-top:10px;">{{Back}}</div>',
+        '{{#Audio}}',
+        '<div id="anki-audio-player" style="text-align: center; margin-top:15px;">{{Audio}}</div>',
+        '''<script>
+            var audioContainer = document.getElementById("anki-audio-player");
+            if (audioContainer) {
+                var audioEle = audioContainer.querySelector("audio");
+                if (audioEle && audioEle.paused) {
+                    var playPromise = audioEle.play();
+                    if (playPromise !== undefined) {
+                        playPromise.catch(error => { console.log("Autoplay prevented: " + error); });
+                    }
+                }
+            }
+        </script>''',
+        '{{/Audio}}'
+    ]
+    
+    model_css = (".card { font-family: Arial, sans-serif; background-color: #F0F0F0; color: #333; } "
+                 "hr#answer { border-top: 1px solid #CCC; margin: 10px 0; } "
+                 ".nightMode .card { background-color: #333; color: #F0F0F0; } "
+                 ".nightMode hr#answer { border-top: 1px solid #555; }"
+                 "#anki-audio-player audio { max-width: 100%; }")
+
+    return genanki.Model(model_id, MODEL_NAME, fields=fields, 
+                         templates=[{"name": "Card 1", "qfmt": qfmt, "afmt": "\n".join(afmt_parts)}],
+                         css=model_css)
+
+def note_fields_for(export_type, word, translation, audio_anki_tag=""):
+    front_content, back_content = "", ""
+    if export_type == "word_front_translation_back": front_content, back_content = word, translation
+    elif export_type == "translation_front_word_back": front_content, back_content = translation, word
+    elif export_type == "word_front_speech_back": front_content, back_content = word, "" 
+    elif export_type == "translation_front_speech_word_back": front_content, back_content = translation, word
+    elif export_type == "word_front_speech_translation_back": front_content, back_content = word, translation
+    
+    return [front_content, back_content, audio_anki_tag if "speech" in export_type else ""]
+
+def _deck_audio_file(word, index, lang, audio_dir, audio_cache, synthesize, extension):
+    # Deck media is named by content hash (see store_media_by_content), so identical
+    # clips are packaged once and files from an earlier export are reused as-is.
+    if audio_cache is None:
+        temp_path = os.path.join(audio_dir, f".export_{index}_{threading.get_ident()}{extension}")
+        if not synthesize(word, lang, temp_path): return None
+        return store_media_by_content(temp_path, audio_dir, move=True)
+    cached_path = audio_cache.get_or_create(word, lang, synthesize)
+    if not cached_path: return None
+    return store_media_by_content(cached_path, audio_dir) # Local copy; no TTS request for known words
+
+async def generate_deck_audio(words, lang, audio_dir, on_progress=None, audio_cache=None,
+                              max_workers=EXPORT_TTS_WORKERS, rate_limiter=None, tts_backend=None, on_clip_ready=None):
+    # Synthesizes on a bounded thread pool; a remote backend is also paced by a
+    # TTS-only rate limiter that backs off on 429s. The audio cache's backend is
+    # used when a cache is given, tts_backend (default gTTS) otherwise.
+    # Returns (audio_paths, failures): audio_paths lines up with words (None where
+    # TTS failed) and failures lists (word, reason) pairs.
+    # on_progress(done, total) runs on the event loop's thread; on_clip_ready(path)
+    # runs on the worker thread as soon as a clip is on disk.
+    loop = asyncio.get_running_loop()
+    if rate_limiter is None:
+        rate_limiter = AdaptiveRateLimiter(name="TTS API", rate=4.0, burst=max_workers, max_rate=20.0)
+    tts_backend = audio_cache.backend if audio_cache else tts_backend or GTTSBackend()
+    synthesize = functools.partial(tts_backend.synthesize, raise_on_throttle=True)
+
+    def deck_audio_file(*args):
+        path = _deck_audio_file(*args)
+        if path and on_clip_ready: on_clip_ready(path)
+        return path
+    audio_paths = [None] * len(words)
+    failures = []
+    completed = [0]
+    worker_slots = asyncio.Semaphore(max_workers)
+
+    async def generate_one(index, word, executor):
+        async with worker_slots:
+            for attempt in range(TTS_MAX_ATTEMPTS):
+                remote_call = tts_backend.rate_limited and not (audio_cache and audio_cache.contains(word, lang))
+                if remote_call: await rate_limiter.acquire()
+                try:
+                    gen_path = await loop.run_in_executor(executor, deck_audio_file, word, index, lang, audio_dir, audio_cache,
+                                                          synthesize, tts_backend.extension)
+                except TTSThrottled:
+                    rate_limiter.on_throttled()
+                    continue
+                except Exception as e:
+                    failures.append((word, str(e)))
+                    break
+                if gen_path and os.path.exists(gen_path):
+                    audio_paths[index] = gen_path
+                    if remote_call: rate_limiter.on_success()
+                else:
+                    failures.append((word, "no audio returned"))
+                break
+            else:
+                failures.append((word, "rate limited (HTTP 429)"))
+        completed[0] += 1
+        if on_progress: on_progress(completed[0], len(words))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-tts") as executor:
+        await asyncio.gather(*(generate_one(index, word, executor) for index, word in enumerate(words)))
+    for word, reason in failures:
+        logging.warning(f"Audio generation/finding failed for '{word}': {reason}")
+    logging.info(f"Export audio: {len(words) - len(failures)}/{len(words)} clips ready. TTS rate limiter: {rate_limiter.stats()}")
+    return audio_paths, failures
+
+class StreamingPackageWriter:
+    # Writes an .apkg incrementally instead of building a genanki.Package in memory.
+    # The collection is a temporary SQLite file with genanki's schema; notes are
+    # inserted through genanki.Note.write_to_db and committed every batch_size
+    # notes, and media goes into the zip the moment it is added. Only the media
+    # name list is kept, so memory stays flat however large the deck is.
+    # add_media may be called from any thread; the package appears at `filepath`
+    # only when close() succeeds.
+    def __init__(self, filepath, deck_name, export_type, model_id=None, deck_id=None,
+                 batch_size=APKG_NOTE_BATCH_SIZE, timestamp=None):
+        # Ids default to stable ones; note GUIDs come from (deck name, word). The
+        # note type is the same for every export type, so switching type updates notes.
+        self.filepath = filepath
+        self.export_type = export_type
+        self.batch_size = batch_size
+        self.timestamp = timestamp or time.time()
+        self.notes_written = 0
+        self.media_bytes = 0
+        self._uncommitted = 0
+        self._id_gen = itertools.count(int(self.timestamp * 1000))
+        self._lock = threading.Lock()
+        self._media_names = {}
+        self.model = build_note_model(model_id or MODEL_ID)
+        self.deck = genanki.Deck(deck_id or stable_id("deck", deck_name), deck_name)
+        self.deck.add_model(self.model)
+
+        db_handle, self._db_path = tempfile.mkstemp(suffix=".anki2")
+        os.close(db_handle)
+        self._part_path = f"{filepath}.part"
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._zip = None
+        try:
+            self._conn.execute("PRAGMA journal_mode=OFF") # Scratch file; a crash just discards it
+            self._conn.execute("PRAGMA synchronous=OFF")
+            cursor = self._conn.cursor()
+            cursor.executescript(APKG_SCHEMA)
+            cursor.executescript(APKG_COL)
+            self.deck.write_to_db(cursor, self.timestamp, self._id_gen) # No notes yet: writes the deck and model JSON
+            self._conn.commit()
+            self._zip = zipfile.ZipFile(self._part_path, "w")
+        except Exception:
+            self.abort()
+            raise
+
+    def add_media(self, path):
+        # Returns the name the media is stored under; a name already in the package is not written again.
+        name = os.path.basename(path)
+        with self._lock:
+            if name not in self._media_names:
+                self._zip.write(path, str(len(self._media_names)))
+                self._media_names[name] = len(self._media_names)
+                self.media_bytes += os.path.getsize(path)
+        return name
+
+    def add_note(self, word, translation, audio_path=None):
+        audio_anki_tag = ""
+        if "speech" in self.export_type and audio_path:
+            audio_anki_tag = f"[sound:{self.add_media(audio_path)}]"
+        note = genanki.Note(model=self.model, fields=note_fields_for(self.export_type, word, translation, audio_anki_tag),
+                            guid=genanki.guid_for(self.deck.name, word))
+        with self._lock:
+            note.write_to_db(self._conn.cursor(), self.timestamp, self.deck.deck_id, self._id_gen)
+            self.notes_written += 1
+            self._uncommitted += 1
+            if self._uncommitted >= self.batch_size:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def add_rows(self, rows, audio_paths=None, on_progress=None):
+        # rows are (word, translation) pairs in deck order; audio_paths lines up with rows.
+        for index, (word, translation) in enumerate(rows):
+            self.add_note(word, translation, audio_paths[index] if audio_paths else None)
+            if on_progress and (index + 1) % self.batch_size == 0: on_progress(index + 1, len(rows))
+        if on_progress: on_progress(len(rows), len(rows))
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.commit()
+                self._conn.close()
+                self._zip.write(self._db_path, "collection.anki2", compress_type=zipfile.ZIP_DEFLATED)
+                self._zip.writestr("media", json.dumps({index: name for name, index in self._media_names.items()}))
+                self._zip.close()
+                os.replace(self._part_path, self.filepath)
+            except Exception:
+                self._discard()
+                raise
+            finally:
+                try: os.remove(self._db_path)
+                except OSError: pass
+        logging.info(f"Wrote '{self.filepath}': {self.notes_written} notes, {len(self._media_names)} media files.")
+        return {"notes": self.notes_written, "media_files": len(self._media_names), "media_bytes": self.media_bytes}
+
+    def _discard(self):
+        try: self._conn.close()
+        except Exception: pass
+        if self._zip:
+            try: self._zip.close()
+            except Exception: pass
+        for path in (self._part_path, self._db_path):
+            try: os.remove(path)
+            except OSError: pass
+
+    def abort(self):
+        with self._lock:
+            self._discard()
+
+
+def audio_fingerprint(lang, tts_backend, media_settings=""):
+    return "|".join([lang, tts_backend.name, tts_backend.voice_settings, media_settings])
+
+class ExportManifest:
+    # What the last export of a deck contained, so a re-export can skip work:
+    # one entry per word with a fingerprint of the note's fields, a fingerprint of
+    # how its audio was made and the clip that was packaged. Stored as JSON per
+    # deck name under EXPORT_MANIFEST_DIR; media_dir is a stable home for the deck's
+    # clips when the caller has no audio folder of its own, so they can be reused.
+    def __init__(self, deck_name, manifest_dir=None):
+        manifest_dir = manifest_dir or EXPORT_MANIFEST_DIR
+        deck_key = hashlib.sha1(deck_name.encode("utf-8")).hexdigest()
+        self.path = os.path.join(manifest_dir, deck_key + ".json")
+        self.media_dir = os.path.join(manifest_dir, deck_key + "_media")
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file).get("notes", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable export manifest '{self.path}': {e}")
+
+    @staticmethod
+    def note_fingerprint(export_type, word, translation):
+        return hashlib.sha1("\0".join([export_type, word, translation]).encode("utf-8")).hexdigest()
+
+    def plan(self, rows, export_type, audio_key=None, changed_only=False):
+        # Returns (rows_to_write, audio_paths, missing_audio): the rows the package
+        # gets (all of them, or only new/changed ones with changed_only), clips from
+        # the last export that are still on disk and were made the same way (lined up
+        # with rows_to_write), and the indexes into rows_to_write still needing audio.
+        rows_to_write, audio_paths, missing_audio = [], [], []
+        for word, translation in rows:
+            entry = self.entries.get(word)
+            if changed_only and entry and entry["note"] == self.note_fingerprint(export_type, word, translation): continue
+            media = entry.get("media") if entry and audio_key and entry.get("audio") == audio_key else None
+            if media and not os.path.exists(media): media = None
+            if audio_key and not media: missing_audio.append(len(rows_to_write))
+            rows_to_write.append((word, translation))
+            audio_paths.append(media)
+        return rows_to_write, audio_paths, missing_audio
+
+    def count_changed(self, rows, export_type):
+        return sum(1 for word, translation in rows
+                   if self.entries.get(word, {}).get("note") != self.note_fingerprint(export_type, word, translation))
+
+    def record(self, rows, export_type, audio_paths=None, audio_key=None):
+        for index, (word, translation) in enumerate(rows):
+            media = audio_paths[index] if audio_paths else None
+            self.entries[word] = {"note": self.note_fingerprint(export_type, word, translation),
+                                  "audio": audio_key if media else None, "media": os.path.abspath(media) if media else None}
+
+    def prune_media(self):
+        # Deletes clips in media_dir that no manifest entry refers to any more.
+        referenced = {entry.get("media") for entry in self.entries.values()}
+        try: names = os.listdir(self.media_dir)
+        except FileNotFoundError: return 0
+        removed = 0
+        for name in names:
+            path = os.path.abspath(os.path.join(self.media_dir, name))
+            if path in referenced: continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Could not remove unused deck clip '{path}': {e}")
+        return removed
+
+    def save(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": 1, "notes": self.entries}, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Could not write export manifest '{self.path}': {e}")
+            try: os.remove(temp_path)
+            except OSError: pass
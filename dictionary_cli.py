@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from word_counting import INPUT_LANGS, WordCountEngine, FrequencyIndexCache, rank_words
+from translation import BatchTranslator, GoogleTranslateBackend, LocalDictionaryBackend, TranslationCache, TARGET_LANG_MAP, TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_MAX_IN_FLIGHT, TRANSLATION_REQUEST_RATE, translate_words
+from media_processing import MEDIA_CODECS, DEFAULT_MEDIA_BITRATE, process_deck_media, format_media_report
+from speech import AudioCache, AUDIO_CACHE_MAX_BYTES, TTS_BACKENDS, create_tts_backend
+from anki_export import EXPORT_TYPES, EXPORT_TTS_WORKERS, generate_deck_audio, StreamingPackageWriter, ExportManifest, audio_fingerprint
+
+# Headless entry point for the dictionary pipeline. It runs the same stages as the
+# GUI (count -> rank -> translate -> speech -> export) without tkinter or pygame:
+#   python dictionary_cli.py pool.txt --input-lang de --target-lang english --limit 500 -o deck.apkg
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create an Anki deck from text files without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="UTF-8 text files to count words in")
+    parser.add_argument("-o", "--output", required=True, help="path of the .apkg file to write")
+    parser.add_argument("--input-lang", default="en", choices=INPUT_LANGS, help="language of the input text (default: en)")
+    parser.add_argument("--target-lang", default="None", help="translation target, as a name or code; 'None' skips translation")
+    parser.add_argument("--limit", type=int, default=50, help="number of most frequent words to keep, 0 for all (default: 50)")
+    parser.add_argument("--export-type", default=EXPORT_TYPES[0], choices=EXPORT_TYPES)
+    parser.add_argument("--deck-name", default="Word Deck")
+    parser.add_argument("--audio-dir", help="keep generated audio here (default: a per-deck folder in the cache, or a temporary folder with --no-cache)")
+    parser.add_argument("--dictionary", help="translate offline from a TSV/StarDict word list (or a prebuilt .adidx index) instead of Google")
+    parser.add_argument("--translation-concurrency", type=int, default=TRANSLATION_MAX_IN_FLIGHT, help=f"translation batches in flight at once (default: {TRANSLATION_MAX_IN_FLIGHT})")
+    parser.add_argument("--translation-rate", type=float, default=TRANSLATION_REQUEST_RATE, help=f"starting translation requests per second; lowered automatically on HTTP 429 (default: {TRANSLATION_REQUEST_RATE:g})")
+    parser.add_argument("--tts-backend", default="gtts", choices=list(TTS_BACKENDS), help="speech engine; espeak-ng runs offline (default: gtts)")
+    parser.add_argument("--compress-audio", choices=list(MEDIA_CODECS), help="trim silence, normalize loudness and re-encode deck audio with ffmpeg")
+    parser.add_argument("--audio-bitrate", default=DEFAULT_MEDIA_BITRATE, help=f"bitrate for --compress-audio (default: {DEFAULT_MEDIA_BITRATE})")
+    parser.add_argument("--tts-workers", type=int, default=EXPORT_TTS_WORKERS, help=f"parallel speech generation workers (default: {EXPORT_TTS_WORKERS})")
+    parser.add_argument("--changed-only", action="store_true", help="only package notes that are new or changed since the last export of this deck")
+    parser.add_argument("--workers", type=int, default=None, help="word counting processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the word count, translation and audio caches or the export manifest")
+    parser.add_argument("--audio-cache-mb", type=int, default=AUDIO_CACHE_MAX_BYTES >> 20, help="size cap of the audio cache in MiB")
+    parser.add_argument("--translation-cache-size", type=int, default=TRANSLATION_CACHE_MAX_ENTRIES, help="max cached translations before LRU eviction")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+def resolve_target_lang(value):
+    if not value or value.lower() == "none": return "None"
+    return TARGET_LANG_MAP.get(value.lower(), value.lower())
+
+def print_timings(timings):
+    print("Stage timings:")
+    for stage, seconds in timings:
+        print(f"  {stage:<10} {seconds:9.3f}s")
+    print(f"  {'total':<10} {sum(seconds for _, seconds in timings):9.3f}s")
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    target_lang_code = resolve_target_lang(args.target_lang)
+    timings = []
+
+    started = time.perf_counter()
+    engine = WordCountEngine(max_workers=args.workers, cache=None if args.no_cache else FrequencyIndexCache())
+    try:
+        word_counts = engine.count_files(args.inputs, args.input_lang)
+    except Exception as e:
+        print(f"Could not process files: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.shutdown()
+    timings.append(("count", time.perf_counter() - started))
+    if not word_counts:
+        print("No words extracted from the input files.", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    ranked = rank_words(word_counts, max(0, args.limit))
+    timings.append(("rank", time.perf_counter() - started))
+    words = [word for word, _ in ranked]
+    print(f"{len(word_counts)} unique words, keeping {len(words)}.")
+
+    started = time.perf_counter()
+    translations = [""] * len(words)
+    if target_lang_code != "None":
+        cache = None
+        if args.dictionary:
+            translator = BatchTranslator(backend=LocalDictionaryBackend(args.dictionary))
+        else:
+            if not args.no_cache: cache = TranslationCache(max_entries=args.translation_cache_size)
+            translator = BatchTranslator(backend=GoogleTranslateBackend(request_rate=args.translation_rate), cache=cache)
+        translations = asyncio.run(translate_words(translator, words, target_lang_code, args.input_lang,
+                                                   args.translation_concurrency))
+        print(f"Translation: {translator.stats()}")
+        if cache: cache.close()
+    timings.append(("translate", time.perf_counter() - started))
+    rows = list(zip(words, translations))
+
+    speech = "speech" in args.export_type
+    tts_backend = audio_key = None
+    if speech:
+        try:
+            tts_backend = create_tts_backend(args.tts_backend)
+        except Exception as e:
+            print(f"Could not start TTS backend: {e}", file=sys.stderr)
+            return 1
+        audio_key = audio_fingerprint(args.input_lang, tts_backend, f"{args.compress_audio}:{args.audio_bitrate}" if args.compress_audio else "")
+    manifest = None if args.no_cache else ExportManifest(args.deck_name)
+    if manifest:
+        rows_to_write, audio_paths, missing_audio = manifest.plan(rows, args.export_type, audio_key, args.changed_only)
+        print(f"Export manifest: {len(rows) - len(rows_to_write)} unchanged note(s) skipped, "
+              f"{len(rows_to_write) - len(missing_audio) if speech else 0} clip(s) reused.")
+    else:
+        rows_to_write, audio_paths, missing_audio = rows, [None] * len(rows), list(range(len(rows))) if speech else []
+    if not rows_to_write:
+        print("No new or changed notes since the last export; nothing written.")
+        return 0
+
+    audio_dir = args.audio_dir
+    temp_audio_dir = None
+    writer = StreamingPackageWriter(args.output, args.deck_name, args.export_type)
+    try:
+        started = time.perf_counter()
+        if missing_audio:
+            if not audio_dir and manifest: audio_dir = manifest.media_dir # Kept, so the next export can reuse the clips
+            elif not audio_dir: audio_dir = temp_audio_dir = tempfile.mkdtemp(prefix="anki_audio_")
+            os.makedirs(audio_dir, exist_ok=True)
+            audio_cache = None if args.no_cache else AudioCache(max_bytes=args.audio_cache_mb << 20, backend=tts_backend)
+            new_paths, audio_failures = asyncio.run(generate_deck_audio([rows_to_write[index][0] for index in missing_audio], args.input_lang,
+                                                                        audio_dir, audio_cache=audio_cache, max_workers=max(1, args.tts_workers),
+                                                                        tts_backend=tts_backend,
+                                                                        on_clip_ready=None if args.compress_audio else writer.add_media))
+            if audio_cache: print(f"Audio cache: {audio_cache.stats()}")
+            if audio_failures:
+                print(f"Audio generation failed for {len(audio_failures)} word(s):", file=sys.stderr)
+                for word, reason in audio_failures: print(f"  {word}: {reason}", file=sys.stderr)
+            timings.append(("speech", time.perf_counter() - started))
+
+            if args.compress_audio and any(new_paths):
+                started = time.perf_counter()
+                try:
+                    new_paths, media_report = asyncio.run(process_deck_media(new_paths, args.compress_audio, args.audio_bitrate))
+                    print(f"Audio compression: {format_media_report(media_report)}")
+                except Exception as e:
+                    print(f"Audio compression skipped: {e}", file=sys.stderr)
+                timings.append(("media", time.perf_counter() - started))
+            for index, path in zip(missing_audio, new_paths): audio_paths[index] = path
+
+        started = time.perf_counter()
+        writer.add_rows(rows_to_write, audio_paths) # Clips streamed in during the speech stage are not written again
+        writer.close()
+        timings.append(("export", time.perf_counter() - started))
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if temp_audio_dir: shutil.rmtree(temp_audio_dir, ignore_errors=True)
+    if manifest:
+        manifest.record(rows_to_write, args.export_type, audio_paths, audio_key)
+        manifest.save()
+        if not args.audio_dir: manifest.prune_media()
+
+    print(f"Wrote {len(rows_to_write)} notes to {args.output}")
+    print_timings(timings)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+
+# Optional export stage that shrinks deck audio with ffmpeg: leading/trailing
+# silence is trimmed, loudness normalized (EBU R128) and the clip re-encoded
+# as low-bitrate mono. Without ffmpeg on PATH the stage is simply unavailable.
+
+MEDIA_CODECS = {
+    "mp3": (".mp3", ["-c:a", "libmp3lame"]),
+    "opus": (".ogg", ["-c:a", "libopus", "-application", "voip"]),
+}
+DEFAULT_MEDIA_CODEC = "mp3"
+DEFAULT_MEDIA_BITRATE = "32k"
+MEDIA_SAMPLE_RATE = 24000
+MEDIA_WORKERS = os.cpu_count() or 2
+SILENCE_THRESHOLD = "-45dB"
+
+# silenceremove only trims the start, so the clip is reversed to trim its end as well
+TRIM_SILENCE_FILTER = (f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD},areverse,"
+                       f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD},areverse")
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""): digest.update(block)
+    return digest.hexdigest()
+
+def store_media_by_content(source_path, media_dir, move=False):
+    # Places the clip in media_dir as <sha256 of its bytes><ext> and returns that
+    # path. Identical clips (two words with the same audio, or the same word on a
+    # re-export into the same folder) end up as one file that is written only once.
+    target_path = os.path.join(media_dir, content_hash(source_path) + os.path.splitext(source_path)[1].lower())
+    if os.path.abspath(target_path) == os.path.abspath(source_path): return target_path
+    if os.path.exists(target_path):
+        if move: os.remove(source_path)
+        return target_path
+    if move:
+        os.replace(source_path, target_path)
+    else:
+        temp_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, target_path)
+    return target_path
+
+def find_ffmpeg():
+    return shutil.which("ffmpeg")
+
+def media_command(ffmpeg, source_path, output_path, codec=DEFAULT_MEDIA_CODEC, bitrate=DEFAULT_MEDIA_BITRATE,
+                  trim_silence=True, normalize=True):
+    filters = [f for f, enabled in ((TRIM_SILENCE_FILTER, trim_silence), (LOUDNORM_FILTER, normalize)) if enabled]
+    command = [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", source_path]
+    if filters: command += ["-af", ",".join(filters)]
+    command += ["-ac", "1", "-ar", str(MEDIA_SAMPLE_RATE)] + MEDIA_CODECS[codec][1] + ["-b:a", bitrate, "-map_metadata", "-1", output_path]
+    return command
+
+def process_clip(ffmpeg, source_path, codec=DEFAULT_MEDIA_CODEC, bitrate=DEFAULT_MEDIA_BITRATE, trim_silence=True, normalize=True):
+    # Replaces source_path with the processed clip (the extension may change with
+    # the codec) and returns the new path. Raises if ffmpeg fails; a re-encode to
+    # the same format that comes out larger is dropped and the original kept.
+    extension = MEDIA_CODECS[codec][0]
+    output_path = os.path.splitext(source_path)[0] + extension
+    temp_path = f"{output_path}.{os.getpid()}.tmp{extension}"
+    try:
+        result = subprocess.run(media_command(ffmpeg, source_path, temp_path, codec, bitrate, trim_silence, normalize),
+                                capture_output=True, timeout=60)
+        if result.returncode != 0 or not os.path.exists(temp_path):
+            raise RuntimeError(result.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {result.returncode}")
+        if os.path.getsize(temp_path) >= os.path.getsize(source_path) and extension == os.path.splitext(source_path)[1]:
+            return source_path
+        os.replace(temp_path, output_path)
+        if output_path != source_path: os.remove(source_path)
+        return output_path
+    finally:
+        if os.path.exists(temp_path):
+            try: os.remove(temp_path)
+            except OSError: pass
+
+async def process_deck_media(audio_paths, codec=DEFAULT_MEDIA_CODEC, bitrate=DEFAULT_MEDIA_BITRATE, trim_silence=True,
+                             normalize=True, max_workers=MEDIA_WORKERS, on_progress=None, ffmpeg=None):
+    # Runs process_clip over the deck's distinct clips in parallel (each one is an
+    # ffmpeg subprocess); results are renamed by content like the originals.
+    # Returns (new_paths, report): new_paths lines up with audio_paths, keeping None
+    # entries and the original path of any clip that failed.
+    # on_progress(done, total) runs on the event loop's thread.
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg: raise RuntimeError("ffmpeg was not found on PATH.")
+    if codec not in MEDIA_CODECS: raise ValueError(f"Unknown codec '{codec}'. Choose one of: {', '.join(MEDIA_CODECS)}.")
+    loop = asyncio.get_running_loop()
+    unique_paths = list(dict.fromkeys(path for path in audio_paths if path))
+    processed = {}
+    report = {"files": len(unique_paths), "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    completed = [0]
+
+    def process_and_rename(path):
+        new_path = process_clip(ffmpeg, path, codec, bitrate, trim_silence, normalize)
+        return store_media_by_content(new_path, os.path.dirname(new_path), move=True) # No-op if the clip was kept
+
+    async def process_one(path, executor):
+        size_before = os.path.getsize(path)
+        try:
+            processed[path] = await loop.run_in_executor(executor, process_and_rename, path)
+        except Exception as e:
+            logging.warning(f"Audio processing failed for '{os.path.basename(path)}', keeping the original: {e}")
+            report["failed"] += 1
+            processed[path] = path
+        report["bytes_before"] += size_before
+        report["bytes_after"] += os.path.getsize(processed[path])
+        completed[0] += 1
+        if on_progress: on_progress(completed[0], len(unique_paths))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="export-media") as executor:
+        await asyncio.gather(*(process_one(path, executor) for path in unique_paths))
+    new_paths = [processed.get(path) if path else None for path in audio_paths]
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    logging.info(f"Media stage: {report}")
+    return new_paths, report
+
+def format_media_report(report):
+    saved_percent = 100 * report["bytes_saved"] / report["bytes_before"] if report["bytes_before"] else 0
+    return (f"{report['files']} clip(s): {report['bytes_before'] / 1024:.0f} KiB -> {report['bytes_after'] / 1024:.0f} KiB, "
+            f"saved {report['bytes_saved'] / 1024:.0f} KiB ({saved_percent:.0f}%)"
+            + (f", {report['failed']} kept unprocessed" if report["failed"] else ""))
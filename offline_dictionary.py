@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+from word_counting import DEFAULT_CACHE_DIR
+
+# Compact lookup index for bilingual word lists, used by the offline translation backend.
+# Layout (little endian):
+#   header   INDEX_MAGIC, entry count (uint64)
+#   offsets  one uint64 per entry, relative to the start of the records
+#   records  b"<headword>\0<translation>\0", sorted by headword bytes
+# The file is memory-mapped and searched with bisection, so opening it costs nothing
+# and a lookup touches ~log2(n) records.
+
+INDEX_MAGIC = b"ADICTIX1"
+INDEX_EXTENSION = ".adidx"
+MAX_TRANSLATION_LENGTH = 200
+_HEADER = struct.Struct("<8sQ")
+_OFFSET = struct.Struct("<Q")
+
+
+def normalize_word(word):
+    return unicodedata.normalize("NFC", str(word).strip().lower())
+
+def _clean_translation(text):
+    text = re.sub(r"<[^>]+>", " ", text) # StarDict definitions are often HTML
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line: return line[:MAX_TRANSLATION_LENGTH]
+    return ""
+
+def _read_tsv(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip() or line.startswith("#"): continue
+            parts = line.rstrip("\r\n").split("\t")
+            if len(parts) >= 2: yield parts[0], parts[1]
+
+def _open_maybe_gzipped(path):
+    for candidate, opener in ((path, open), (path + ".dz", gzip.open), (path + ".gz", gzip.open)):
+        if os.path.exists(candidate): return opener(candidate, "rb")
+    raise FileNotFoundError(path)
+
+def _read_stardict(path):
+    base = re.sub(r"\.(ifo|idx|idx\.gz|dict|dict\.dz)$", "", path)
+    offset_bits = 32
+    if os.path.exists(base + ".ifo"):
+        with open(base + ".ifo", "r", encoding="utf-8", errors="replace") as file:
+            for line in file:
+                if line.startswith("idxoffsetbits="): offset_bits = int(line.split("=", 1)[1])
+    entry_tail = struct.Struct(">QI" if offset_bits == 64 else ">II")
+    with _open_maybe_gzipped(base + ".idx") as file: idx = file.read()
+    with _open_maybe_gzipped(base + ".dict") as file: data = file.read() # Build step only
+    pos = 0
+    while pos < len(idx):
+        end = idx.index(b"\0", pos)
+        offset, size = entry_tail.unpack_from(idx, end + 1)
+        yield idx[pos:end].decode("utf-8", "replace"), data[offset:offset + size].decode("utf-8", "replace")
+        pos = end + 1 + entry_tail.size
+
+def is_stardict_path(path):
+    return re.search(r"\.(ifo|idx|idx\.gz|dict|dict\.dz)$", path) is not None
+
+def build_dictionary_index(source_path, index_path):
+    reader = _read_stardict if is_stardict_path(source_path) else _read_tsv
+    entries = {}
+    for word, translation in reader(source_path):
+        key = normalize_word(word)
+        translation = _clean_translation(translation)
+        if not key or not translation or "\0" in key or "\0" in translation: continue
+        existing = entries.get(key)
+        if existing is None:
+            entries[key] = translation
+        elif translation not in existing.split("; ") and len(existing) < MAX_TRANSLATION_LENGTH:
+            entries[key] = f"{existing}; {translation}"
+
+    keys = sorted(entries) # Code point order is UTF-8 byte order, which lookups compare in
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(INDEX_MAGIC, len(keys)))
+        records = []
+        offset = 0
+        for key in keys:
+            record = key.encode("utf-8") + b"\0" + entries[key].encode("utf-8") + b"\0"
+            file.write(_OFFSET.pack(offset))
+            records.append(record)
+            offset += len(record)
+        file.writelines(records)
+    os.replace(temp_path, index_path)
+    logging.info(f"Built dictionary index '{index_path}' with {len(keys)} entries from '{source_path}'.")
+    return index_path
+
+
+class DictionaryIndex:
+    def __init__(self, index_path):
+        self.path = index_path
+        with open(index_path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC:
+            self._mm.close()
+            raise ValueError(f"'{index_path}' is not a dictionary index.")
+        self._records_at = _HEADER.size + self._count * _OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def _record_start(self, position):
+        return self._records_at + _OFFSET.unpack_from(self._mm, _HEADER.size + position * _OFFSET.size)[0]
+
+    def _key_at(self, position):
+        start = self._record_start(position)
+        end = self._mm.find(b"\0", start)
+        return self._mm[start:end], end
+
+    def lookup(self, word):
+        key = normalize_word(word).encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle)[0] < key: low = middle + 1
+            else: high = middle
+        if low < self._count:
+            found_key, key_end = self._key_at(low)
+            if found_key == key:
+                value_end = self._mm.find(b"\0", key_end + 1)
+                return self._mm[key_end + 1:value_end].decode("utf-8")
+        return None
+
+    def close(self):
+        self._mm.close()
+
+
+def default_index_path(source_path):
+    stat = os.stat(source_path)
+    stamp = f"{os.path.abspath(source_path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8")
+    return os.path.join(DEFAULT_CACHE_DIR, "dictionaries", hashlib.sha1(stamp).hexdigest() + INDEX_EXTENSION)
+
+def open_dictionary(path):
+    # Accepts a prebuilt index or a word list; a word list is indexed once and the
+    # index reused until the list changes.
+    if path.endswith(INDEX_EXTENSION):
+        return DictionaryIndex(path)
+    index_path = default_index_path(path)
+    if not os.path.exists(index_path):
+        build_dictionary_index(path, index_path)
+    return DictionaryIndex(index_path)
+
+
+if __name__ == "__main__":
+    # Prebuild an index: python offline_dictionary.py words.tsv words.adidx
+    if len(sys.argv) != 3:
+        print(f"usage: {os.path.basename(sys.argv[0])} <word list .tsv/.ifo> <output{INDEX_EXTENSION}>", file=sys.stderr)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_dictionary_index(sys.argv[1], sys.argv[2])
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+
+
+def is_throttling_error(error):
+    return "TooManyRequests" in str(error) or "429" in str(error)
+
+
+class AdaptiveRateLimiter:
+    # Token bucket shared by every call to one remote API (translation, TTS). Tokens
+    # are requests (or clips), refilled at `rate` per second. The rate follows AIMD:
+    # it is halved (and the bucket drained) on a 429, and raised by `increase` after
+    # each run of successes. A 429 also starts a cool-down that every caller waits
+    # out; it doubles (up to max_cooldown) for each 429 that follows a cool-down,
+    # and resets after a success.
+    def __init__(self, name="Remote API", rate=8.0, burst=30, min_rate=0.5, max_rate=40.0, increase=0.5, successes_per_increase=5,
+                 cooldown=2.0, max_cooldown=60.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.successes_per_increase = successes_per_increase
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.tokens = float(burst)
+        self.queue_depth = 0
+        self.throttle_events = 0
+        self._successes = 0
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._blocked_until = 0.0
+        self._throttle_streak = 0 # Cool-downs since the last success
+        self._lock = asyncio.Lock() # Waiters are served in FIFO order
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, cost=1):
+        # A cost above the burst size is allowed once the bucket is full; the
+        # bucket then goes into debt and later callers wait it off.
+        needed = min(cost, self.burst)
+        self.queue_depth += 1
+        try:
+            async with self._lock:
+                while True:
+                    blocked_for = self._blocked_until - time.monotonic()
+                    if blocked_for > 0:
+                        await asyncio.sleep(blocked_for)
+                        continue
+                    self._refill()
+                    if self.tokens >= needed:
+                        self.tokens -= cost
+                        return
+                    await asyncio.sleep((needed - self.tokens) / self.rate)
+        finally:
+            self.queue_depth -= 1
+
+    def on_success(self):
+        self._throttle_streak = 0
+        self._successes += 1
+        if self._successes >= self.successes_per_increase:
+            self._successes = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self):
+        self._refill()
+        self._successes = 0
+        self.throttle_events += 1
+        self.tokens = min(self.tokens, 0.0)
+        # Batches in flight together all see the same 429; only halve once for them.
+        if self._updated - self._last_decrease >= 1.0:
+            self._last_decrease = self._updated
+            self.rate = max(self.min_rate, self.rate / 2)
+        # A 429 during a cool-down came from a request sent before it; one sent
+        # after it ended means the API still wants us to back off, for longer.
+        if self._updated >= self._blocked_until:
+            self._throttle_streak += 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (self._throttle_streak - 1))
+            self._blocked_until = self._updated + cooldown
+        logging.warning(f"{self.name} is throttling us, slowing down: {self.stats()}")
+
+    def stats(self):
+        return {"rate": round(self.rate, 2), "queue_depth": self.queue_depth, "throttle_events": self.throttle_events,
+                "cooldown_left": round(max(0.0, self._blocked_until - time.monotonic()), 2)}
@@ -0,0 +1,123 @@
+import bisect
+import itertools
+import time
+
+# Filter index over one processing run's ResultsStore, built once when the run
+# finishes. Lower-cased words are kept in a sorted array (a prefix query is two
+# bisections) and joined into one string (a substring query is str.find over it,
+# jumping to the next word after each hit). Rows are in rank order, so counts
+# are descending and a count range is a contiguous slice of rows.
+# Searches run in slices of FILTER_FRAME_BUDGET so typing never blocks a frame.
+
+FILTER_FRAME_BUDGET = 0.008 # Seconds of searching per UI frame
+FILTER_STEP_ROWS = 1024 # Rows (or hits) handled between budget checks
+MATCH_PREFIX = "prefix"
+MATCH_SUBSTRING = "substring"
+
+
+class ResultsFilterIndex:
+    def __init__(self, store):
+        words, counts = store.words, store.counts # New lists after store.clear(), so this run's lists stay intact
+        self.size = len(words)
+        self.keys = [word.lower() for word in words]
+        self.sorted_rows = sorted(range(self.size), key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[row] for row in self.sorted_rows]
+        self.text = "\n".join(self.keys) # Tokens never contain a newline
+        self.line_starts = list(itertools.accumulate((len(key) + 1 for key in self.keys), initial=0))
+        self._negated_counts = [-count for count in counts[:self.size]]
+
+    def count_slice(self, min_count=None, max_count=None):
+        # [start, end) of the rows whose count lies in the range.
+        start = 0 if max_count is None else bisect.bisect_left(self._negated_counts, -max_count)
+        end = self.size if min_count is None else bisect.bisect_right(self._negated_counts, -min_count)
+        return start, max(start, end)
+
+    def prefix_rows(self, prefix):
+        # Rows whose word starts with prefix, in row order.
+        low = bisect.bisect_left(self.sorted_keys, prefix)
+        high = bisect.bisect_left(self.sorted_keys, prefix + "\U0010ffff", low)
+        return sorted(self.sorted_rows[low:high])
+
+    def row_of_offset(self, offset):
+        return bisect.bisect_right(self.line_starts, offset) - 1
+
+
+class SlicedWork:
+    # Work split into steps by the _steps generator. run() works until its budget
+    # is spent and returns True once finished; rows grows as it goes.
+    def run(self, budget=FILTER_FRAME_BUDGET):
+        deadline = time.perf_counter() + budget
+        for _ in self._steps:
+            if time.perf_counter() >= deadline: return False
+        self.done = True
+        return True
+
+
+class FilterSearch(SlicedWork):
+    # One query against the index; rows are kept in row order. A substring
+    # search that refines a finished previous one (its query contains the previous
+    # query) scans the previous hits instead of the whole index; prefix searches
+    # are cheap enough to always bisect afresh.
+    def __init__(self, index, query, mode=MATCH_PREFIX, min_count=None, max_count=None, previous=None):
+        self.index = index
+        self.query = query.strip().lower()
+        self.mode = mode
+        self.min_count = min_count
+        self.max_count = max_count
+        self.rows = []
+        self.done = False
+        self._steps = self._search(previous if self._refines(previous) else None)
+
+    def _refines(self, previous):
+        if self.mode != MATCH_SUBSTRING or previous is None or not previous.done or previous.index is not self.index: return False
+        if (previous.mode, previous.min_count, previous.max_count) != (self.mode, self.min_count, self.max_count): return False
+        return bool(previous.query) and previous.query in self.query
+
+    def _search(self, previous):
+        index = self.index
+        start, end = index.count_slice(self.min_count, self.max_count)
+        query = self.query
+        if not query:
+            self.rows = range(start, end)
+        elif previous is not None:
+            keys = index.keys
+            for chunk_start in range(0, len(previous.rows), FILTER_STEP_ROWS):
+                self.rows.extend(row for row in previous.rows[chunk_start:chunk_start + FILTER_STEP_ROWS] if query in keys[row])
+                yield
+        elif self.mode == MATCH_PREFIX:
+            rows = index.prefix_rows(query)
+            self.rows = rows[bisect.bisect_left(rows, start):bisect.bisect_left(rows, end)]
+        else:
+            text, line_starts = index.text, index.line_starts
+            limit = line_starts[end] - 1 if end else 0
+            position = text.find(query, line_starts[start], limit)
+            while position != -1:
+                for _ in range(FILTER_STEP_ROWS):
+                    row = index.row_of_offset(position)
+                    self.rows.append(row)
+                    position = text.find(query, line_starts[row + 1], limit)
+                    if position == -1: break
+                yield
+
+
+class SortedHits(SlicedWork):
+    # The hits of a finished search in a cached sort order (a permutation of every
+    # row): the hits are marked, then the order is walked keeping marked rows. This
+    # is linear and sliced, unlike sorting the hits by rank in one go.
+    def __init__(self, order, hits, size):
+        self.rows = []
+        self.done = False
+        self._steps = self._walk(order, hits, size)
+
+    def _walk(self, order, hits, size):
+        marked = bytearray(size)
+        if isinstance(hits, range):
+            marked[hits.start:hits.stop] = b"\x01" * len(hits)
+        else:
+            for chunk_start in range(0, len(hits), FILTER_STEP_ROWS):
+                for row in hits[chunk_start:chunk_start + FILTER_STEP_ROWS]: marked[row] = 1
+                yield
+        for chunk_start in range(0, len(order), FILTER_STEP_ROWS):
+            chunk = order[chunk_start:chunk_start + FILTER_STEP_ROWS]
+            self.rows.extend(itertools.compress(chunk, map(marked.__getitem__, chunk)))
+            yield
@@ -0,0 +1,73 @@
+import locale
+from translation import TRANSLATION_ERROR_MARKERS
+
+# Columnar model of one processing run's results. Row i is the i-th most frequent
+# word; each column is a plain list, so readers (export, speak, copy, views) index
+# Python data directly instead of asking the widget for its values back.
+
+STATUS_TRANSLATED = "translated"
+STATUS_UNTRANSLATED = "untranslated" # No target language, or nothing found
+STATUS_FAILED = "failed"
+
+SORT_COLUMNS = ("word", "count", "translation")
+
+
+class ResultsStore:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.words = []
+        self.counts = []
+        self.translations = []
+        self.audio = [] # Last clip made for the row (path), or None
+        self.status = []
+        self._sort_orders = {} # (column, descending) -> (row permutation, rank of each row)
+
+    def __len__(self):
+        return len(self.words)
+
+    def append_rows(self, words, counts, translations):
+        # Returns the index of the first appended row.
+        start = len(self.words)
+        for translation in translations:
+            if translation in TRANSLATION_ERROR_MARKERS: self.status.append(STATUS_FAILED)
+            elif translation: self.status.append(STATUS_TRANSLATED)
+            else: self.status.append(STATUS_UNTRANSLATED)
+        self.words.extend(str(word) for word in words)
+        self.counts.extend(int(count) for count in counts)
+        self.translations.extend(str(translation) for translation in translations)
+        self.audio.extend([None] * len(words))
+        self._sort_orders.clear()
+        return start
+
+    def row(self, index):
+        return self.words[index], self.counts[index], self.translations[index]
+
+    def export_rows(self, indexes=None):
+        # (word, translation) pairs in row order, for all rows or the given ones.
+        if indexes is None: return list(zip(self.words, self.translations))
+        return [(self.words[index], self.translations[index]) for index in indexes]
+
+    def set_audio(self, indexes, paths):
+        for index, path in zip(indexes, paths):
+            if path: self.audio[index] = path
+
+    def _sorted_permutation(self, column, descending):
+        # Stable in both directions, so ties keep their rank order.
+        if column == "count": keys = self.counts
+        else: keys = [locale.strxfrm(value) for value in (self.words if column == "word" else self.translations)] # User's LC_COLLATE
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+
+    def sort_order(self, column, descending=False):
+        # Rows ordered by column, as (order, ranks) where ranks[row] is the row's
+        # position in order. Computed once per column and direction and reused
+        # until rows are added, so re-sorting only hands the view another list.
+        cache_key = (column, descending)
+        if cache_key not in self._sort_orders:
+            if column not in SORT_COLUMNS: raise ValueError(f"Unknown sort column '{column}'.")
+            order = self._sorted_permutation(column, descending)
+            ranks = [0] * len(order)
+            for position, row in enumerate(order): ranks[row] = position
+            self._sort_orders[cache_key] = (order, ranks)
+        return self._sort_orders[cache_key]
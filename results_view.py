@@ -0,0 +1,162 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Virtualized table over a ResultsStore. The Treeview only ever holds the rows on
+# screen plus RENDER_MARGIN below them; scrolling re-targets those items to other
+# store rows, so the widget cost is independent of the number of results. Item ids
+# are store row indexes (as strings), which is what callers get back from
+# selection and identify_row. An optional order (a sequence of store rows) lets
+# a filter show a subset of the rows without touching the store.
+
+RENDER_MARGIN = 5
+DEFAULT_ROW_HEIGHT = 20
+SPEAK_SYMBOL = "🔊"
+
+
+class VirtualResultsView:
+    def __init__(self, parent, store, on_scroll=None):
+        self.store = store
+        self.on_scroll = on_scroll
+        self.top = 0 # View position of the first row on screen
+        self.order = None # Store rows shown, by view position; None shows every row in store order
+        self.selected_rows = set() # Store rows, including ones scrolled out of the widget
+        self._visible_count = 1
+        self._row_height = DEFAULT_ROW_HEIGHT
+        self._header_height = 0
+        self._measured = False
+        self._rendered = [] # Item ids currently in the widget, top to bottom
+
+        self.tree = ttk.Treeview(parent, columns=("Word", "Count", "Translation", "Speak"), show="headings")
+        self.tree.heading("Word", text="Word")
+        self.tree.heading("Count", text="Count")
+        self.tree.heading("Translation", text="Translation")
+        self.tree.heading("Speak", text="Speak")
+        self.tree.column("Word", width=150, stretch=tk.YES)
+        self.tree.column("Count", width=60, stretch=tk.NO, anchor="center")
+        self.tree.column("Translation", width=200, stretch=tk.YES)
+        self.tree.column("Speak", width=60, stretch=tk.NO, anchor="center")
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+
+        self.tree.bind("<Configure>", lambda event: self._measure(event.height))
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Button-1>", self._on_click)
+        self.tree.bind("<MouseWheel>", lambda event: self._scroll_by(-1 if event.delta > 0 else 1, "wheel"))
+        self.tree.bind("<Button-4>", lambda event: self._scroll_by(-1, "wheel"))
+        self.tree.bind("<Button-5>", lambda event: self._scroll_by(1, "wheel"))
+        self.tree.bind("<Up>", lambda event: self._move_focus(-1))
+        self.tree.bind("<Down>", lambda event: self._move_focus(1))
+        self.tree.bind("<Prior>", lambda event: self._scroll_by(-self._visible_count, "key"))
+        self.tree.bind("<Next>", lambda event: self._scroll_by(self._visible_count, "key"))
+        self.tree.bind("<Home>", lambda event: self.scroll_to(0) or "break")
+        self.tree.bind("<End>", lambda event: self.scroll_to(len(self)) or "break")
+
+    def grid(self, row, column, columnspan, **grid_options):
+        self.tree.grid(row=row, column=column, columnspan=columnspan, sticky="nsew", **grid_options)
+        self.scrollbar.grid(row=row, column=column + columnspan, sticky="ns")
+
+    def __len__(self):
+        return len(self.store) if self.order is None else len(self.order)
+
+    def row_at(self, position):
+        return position if self.order is None else self.order[position]
+
+    def rows(self):
+        return range(len(self.store)) if self.order is None else self.order
+
+    def set_order(self, order, keep_position=False):
+        self.order = order
+        if not keep_position: self.top = 0
+        self.refresh()
+        if self.on_scroll: self.on_scroll()
+
+    def visible_rows(self):
+        return [self.row_at(position) for position in range(self.top, min(self.top + self._visible_count, len(self)))]
+
+    def clear(self):
+        # O(1) in the number of results: only the on-screen items exist.
+        self.top = 0
+        self.order = None
+        self.selected_rows.clear()
+        self.refresh()
+
+    def refresh(self):
+        # Re-renders the window; call after the store (or the row order) changes.
+        self.top = max(0, min(self.top, len(self) - self._visible_count))
+        wanted = [str(self.row_at(position)) for position in range(self.top, min(self.top + self._visible_count + RENDER_MARGIN, len(self)))]
+        if wanted != self._rendered:
+            if self._rendered: self.tree.delete(*self._rendered)
+            for item_id in wanted:
+                word, count, translation = self.store.row(int(item_id))
+                self.tree.insert("", "end", iid=item_id, values=(word, count, translation, SPEAK_SYMBOL))
+            self._rendered = wanted
+            if wanted: self.tree.yview_moveto(0) # The widget itself never scrolls; the window moves instead
+            visible_selection = [item_id for item_id in wanted if int(item_id) in self.selected_rows]
+            self.tree.selection_set(visible_selection)
+            if wanted and not self._measured: self.tree.after_idle(lambda: self._measure(self.tree.winfo_height()))
+        self._update_scrollbar()
+
+    def rows_appended(self):
+        # Cheap when the new rows are below the window: only the scrollbar changes.
+        if self.order is not None: return # Not part of the current order
+        if len(self._rendered) < self._visible_count + RENDER_MARGIN: self.refresh()
+        else: self._update_scrollbar()
+
+    def scroll_to(self, position):
+        top = max(0, min(int(position), len(self) - self._visible_count))
+        if top == self.top and self._rendered: return
+        self.top = top
+        self.refresh()
+        if self.on_scroll: self.on_scroll()
+
+    def _update_scrollbar(self):
+        total = len(self)
+        if total <= self._visible_count: self.scrollbar.set(0, 1)
+        else: self.scrollbar.set(self.top / total, min(1.0, (self.top + self._visible_count) / total))
+
+    def _measure(self, widget_height):
+        # Row and heading heights come from the first rendered item's bounding box.
+        if self._rendered:
+            bbox = self.tree.bbox(self._rendered[0])
+            if bbox:
+                self._header_height = bbox[1]
+                self._row_height = max(1, bbox[3])
+                self._measured = True
+        visible_count = max(1, (widget_height - self._header_height) // self._row_height)
+        if visible_count != self._visible_count:
+            self._visible_count = visible_count
+            self.refresh()
+            if self.on_scroll: self.on_scroll()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self))
+        elif action == "scroll":
+            step = self._visible_count if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _scroll_by(self, rows, source):
+        self.scroll_to(self.top + rows * (3 if source == "wheel" else 1))
+        return "break"
+
+    def _move_focus(self, step):
+        # Arrow keys past the edge of the window scroll the window instead of the widget.
+        focus = self.tree.focus()
+        rows = self.visible_rows()
+        if not focus or not rows: return None
+        if (step < 0 and int(focus) == rows[0]) or (step > 0 and int(focus) == rows[-1]):
+            position = self.top + (0 if step < 0 else len(rows) - 1) + step
+            if 0 <= position < len(self):
+                self.scroll_to(self.top + step)
+                target = str(self.row_at(position))
+                self.selected_rows = {int(target)}
+                self.tree.selection_set(target)
+                self.tree.focus(target)
+            return "break"
+        return None
+
+    def _on_click(self, event):
+        if not event.state & 0x0005: self.selected_rows.clear() # A plain click (no Shift/Control) starts a new selection
+
+    def _on_select(self, event=None):
+        rendered_rows = {int(item_id) for item_id in self._rendered}
+        self.selected_rows = (self.selected_rows - rendered_rows) | {int(item_id) for item_id in self.tree.selection()}
@@ -0,0 +1,337 @@
+from collections import OrderedDict
+import gtts
+import hashlib
+import heapq
+import io
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from rate_limiting import is_throttling_error
+from word_counting import DEFAULT_CACHE_DIR
+
+AUDIO_CACHE_MAX_BYTES = 500 << 20
+CLIP_MEMORY_MAX_BYTES = 32 << 20 # Recently played clips kept decoded-ready in RAM (~10 KB per word)
+
+
+class TTSThrottled(Exception):
+    pass
+
+
+def text_to_speech(text, lang='en', filename='output.mp3', raise_on_throttle=False):
+    if not text or not str(text).strip(): logging.warning("TTS: empty text."); return None
+    try:
+        logging.debug(f"gTTS: text='{text}', lang='{lang}', file='{filename}'")
+        tts = gtts.gTTS(text=str(text), lang=lang)
+        tts.save(filename)
+        logging.info(f"Audio saved to {filename}")
+        return filename
+    except Exception as e:
+        logging.error(f"Error during gTTS speech generation for '{text}': {e}")
+        if raise_on_throttle and is_throttling_error(e):
+            raise TTSThrottled(str(e)) from e
+        if "No text to send" in str(e) and (not text or not str(text).strip()):
+            return None
+        return None
+
+def text_to_speech_bytes(text, lang='en', raise_on_throttle=False):
+    # Same as text_to_speech, but the mp3 is returned as bytes instead of touching the disk.
+    if not text or not str(text).strip(): logging.warning("TTS: empty text."); return None
+    try:
+        logging.debug(f"gTTS: text='{text}', lang='{lang}', in memory")
+        buffer = io.BytesIO()
+        gtts.gTTS(text=str(text), lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+    except Exception as e:
+        logging.error(f"Error during gTTS speech generation for '{text}': {e}")
+        if raise_on_throttle and is_throttling_error(e):
+            raise TTSThrottled(str(e)) from e
+        return None
+
+
+class TTSBackend:
+    # Interface for speech engines. synthesize() writes one clip to `filename` and
+    # returns it (None on failure); synthesize_bytes() returns the encoded clip.
+    # name and voice_settings are part of every AudioCache key, so clips from
+    # different engines or voices are cached separately.
+    name = "base"
+    extension = ".mp3"
+    voice_settings = ""
+    rate_limited = True # Remote service: exports pace it and back off on throttling
+
+    def synthesize_bytes(self, text, lang='en', raise_on_throttle=False):
+        raise NotImplementedError
+
+    def synthesize(self, text, lang='en', filename='output.mp3', raise_on_throttle=False):
+        clip = self.synthesize_bytes(text, lang, raise_on_throttle)
+        if not clip: return None
+        with open(filename, "wb") as file: file.write(clip)
+        return filename
+
+
+class GTTSBackend(TTSBackend):
+    name = "gtts"
+
+    def synthesize_bytes(self, text, lang='en', raise_on_throttle=False):
+        return text_to_speech_bytes(text, lang, raise_on_throttle)
+
+    def synthesize(self, text, lang='en', filename='output.mp3', raise_on_throttle=False):
+        return text_to_speech(text, lang, filename, raise_on_throttle)
+
+
+class EspeakBackend(TTSBackend):
+    # Local synthesis with espeak-ng (or classic espeak), one subprocess per clip:
+    # no network, no throttling, ~10-50 ms per word. Output is WAV.
+    name = "espeak-ng"
+    extension = ".wav"
+    rate_limited = False
+    VOICES = {"zh-cn": "cmn", "he": "he", "id": "id"} # Input language codes espeak names differently
+
+    def __init__(self, executable=None, speed=150):
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.executable:
+            raise RuntimeError("espeak-ng was not found. Install it (e.g. 'apt install espeak-ng') or pick another TTS backend.")
+        self.speed = speed
+        self.voice_settings = f"speed={speed}"
+
+    def synthesize_bytes(self, text, lang='en', raise_on_throttle=False):
+        if not text or not str(text).strip(): logging.warning("TTS: empty text."); return None
+        command = [self.executable, "--stdout", "-v", self.VOICES.get(lang, lang), "-s", str(self.speed)]
+        try:
+            # Text goes through stdin so words starting with '-' are not read as options
+            result = subprocess.run(command, input=str(text).strip().encode("utf-8"), capture_output=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Error during espeak speech generation for '{text}': {e}")
+            return None
+        if result.returncode != 0 or not result.stdout:
+            logging.error(f"espeak failed for '{text}' (exit {result.returncode}): {result.stderr.decode('utf-8', 'replace').strip()}")
+            return None
+        return result.stdout
+
+
+TTS_BACKENDS = {"gtts": GTTSBackend, "espeak-ng": EspeakBackend}
+
+def create_tts_backend(name):
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'. Choose one of: {', '.join(TTS_BACKENDS)}.")
+    return TTS_BACKENDS[name]()
+
+
+class AudioCache:
+    # Content-addressed clip store shared by speak, speak-all and export. A clip is
+    # saved as <sha256 of (text, language, TTS backend, voice settings)>.<ext>, so a
+    # known word is never synthesized twice. `backend` is the engine clips are
+    # currently made with and may be swapped between runs. A hit refreshes the file's mtime, and
+    # once the folder grows past max_bytes the least recently used clips are deleted.
+    # Safe to use from several threads; concurrent requests for one clip synthesize it once.
+    def __init__(self, cache_dir=None, max_bytes=AUDIO_CACHE_MAX_BYTES, backend=None):
+        self.cache_dir = cache_dir or os.path.join(DEFAULT_CACHE_DIR, "audio")
+        self.max_bytes = max_bytes
+        self.backend = backend or GTTSBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._in_progress = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._sizes = {}
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                try: os.remove(path) # Left over from an interrupted synthesis
+                except OSError: pass
+            elif os.path.isfile(path):
+                self._sizes[path] = os.path.getsize(path)
+        self._total_bytes = sum(self._sizes.values())
+
+    def key_for(self, text, lang):
+        material = "\0".join([str(text).strip(), lang, self.backend.name, self.backend.voice_settings])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def path_for(self, text, lang):
+        return os.path.join(self.cache_dir, self.key_for(text, lang) + self.backend.extension)
+
+    def contains(self, text, lang):
+        path = self.path_for(text, lang)
+        with self._lock:
+            return path in self._sizes and os.path.exists(path)
+
+    def get_or_create(self, text, lang, synthesize=None):
+        # Returns the cached clip's path, synthesizing it on a miss; None if TTS failed.
+        if not text or not str(text).strip(): return None
+        synthesize = synthesize or self.backend.synthesize
+        path = self.path_for(text, lang)
+        while True:
+            with self._lock:
+                if path in self._sizes and os.path.exists(path):
+                    self.hits += 1
+                    try: os.utime(path)
+                    except OSError: pass
+                    return path
+                pending = self._in_progress.get(path)
+                if pending is None:
+                    pending = self._in_progress[path] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait() # Another thread is synthesizing this clip
+
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            if not synthesize(str(text).strip(), lang, temp_path) or not os.path.exists(temp_path):
+                return None
+            os.replace(temp_path, path)
+            with self._lock:
+                size = os.path.getsize(path)
+                self._total_bytes += size - self._sizes.get(path, 0)
+                self._sizes[path] = size
+                if self._total_bytes > self.max_bytes: self._evict()
+            return path
+        finally:
+            if os.path.exists(temp_path):
+                try: os.remove(temp_path)
+                except OSError: pass
+            with self._lock:
+                self._in_progress.pop(path).set()
+
+    def _evict(self):
+        # Called with the lock held. Trims to 90% of the cap so eviction is not re-run on every new clip.
+        def last_used(path):
+            try: return os.path.getmtime(path)
+            except OSError: return 0
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for path in sorted(self._sizes, key=last_used):
+            if self._total_bytes <= target: break
+            try: os.remove(path)
+            except OSError: pass
+            self._total_bytes -= self._sizes.pop(path)
+            evicted += 1
+        logging.info(f"Audio cache: evicted {evicted} least recently used clip(s).")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "clips": len(self._sizes), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+
+class ClipMemoryCache:
+    # LRU of encoded clips for playback straight from memory. A miss is filled from
+    # the disk AudioCache when one is given (synthesizing into it if needed, without
+    # reading the new file back), or synthesized in memory otherwise. Clips are made
+    # with the audio cache's backend, or `backend` when there is no audio cache.
+    def __init__(self, audio_cache=None, max_bytes=CLIP_MEMORY_MAX_BYTES, backend=None):
+        self.audio_cache = audio_cache
+        self.backend = audio_cache.backend if audio_cache else backend or GTTSBackend()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._clips = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _key(self, text, lang):
+        if self.audio_cache: return self.audio_cache.key_for(text, lang)
+        return (text, lang, self.backend.name, self.backend.voice_settings)
+
+    def get_or_create(self, text, lang):
+        text = str(text).strip()
+        if not text: return None
+        key = self._key(text, lang)
+        with self._lock:
+            data = self._clips.get(key)
+            if data is not None:
+                self._clips.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        if self.audio_cache is None:
+            data = self.backend.synthesize_bytes(text, lang)
+        else:
+            synthesized = []
+            def synthesize(text, lang, filename):
+                clip = self.backend.synthesize_bytes(text, lang)
+                if not clip: return None
+                with open(filename, "wb") as file: file.write(clip)
+                synthesized.append(clip)
+                return filename
+            path = self.audio_cache.get_or_create(text, lang, synthesize=synthesize)
+            if synthesized: data = synthesized[0]
+            elif path:
+                with open(path, "rb") as file: data = file.read()
+        if not data: return None
+
+        with self._lock:
+            if key not in self._clips:
+                self._clips[key] = data
+                self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._clips) > 1:
+                self._total_bytes -= len(self._clips.popitem(last=False)[1])
+        return data
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "clips": len(self._clips), "bytes": self._total_bytes}
+
+
+class AudioPrefetcher:
+    # Low-priority background filler for an AudioCache: a single daemon thread,
+    # paced to `rate` clips/second, synthesizes queued words so later clicks play
+    # from disk. Lower priority values run first; queuing a word again with a lower
+    # value promotes it (the older heap entry is skipped as stale).
+    def __init__(self, audio_cache, rate=2.0):
+        self.audio_cache = audio_cache
+        self.interval = 1.0 / rate
+        self.generated = 0
+        self._heap = []
+        self._best_priority = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="audio-prefetch", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, text, lang, priority):
+        key = (str(text).strip(), lang)
+        if not key[0]: return
+        with self._condition:
+            if priority >= self._best_priority.get(key, float("inf")): return
+            self._best_priority[key] = priority
+            heapq.heappush(self._heap, (priority, next(self._sequence), key))
+            self._condition.notify()
+
+    def clear(self):
+        with self._condition:
+            self._heap.clear()
+            self._best_priority.clear()
+
+    def pending(self):
+        with self._condition:
+            return len(self._best_priority)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _next_item(self):
+        with self._condition:
+            while not self._stopped:
+                while self._heap:
+                    priority, _, key = heapq.heappop(self._heap)
+                    if self._best_priority.get(key) == priority:
+                        del self._best_priority[key]
+                        return key
+                self._condition.wait()
+            return None
+
+    def _run(self):
+        while True:
+            key = self._next_item()
+            if key is None: return
+            text, lang = key
+            if self.audio_cache.contains(text, lang): continue
+            try:
+                if self.audio_cache.get_or_create(text, lang): self.generated += 1
+            except Exception as e:
+                logging.warning(f"Audio pre-generation failed for '{text}': {e}")
+            time.sleep(self.interval) # Leave the TTS service's budget to on-demand clicks
@@ -0,0 +1,313 @@
+from googletrans import Translator
+import asyncio
+import inspect
+import logging
+import os
+import sqlite3
+from word_counting import DEFAULT_CACHE_DIR
+from offline_dictionary import normalize_word, open_dictionary
+from rate_limiting import AdaptiveRateLimiter, is_throttling_error
+
+TARGET_LANG_MAP = {"english": "en", "arabic": "ar", "german": "de", "spanish": "es", "french": "fr", "italian": "it", "portuguese": "pt"}
+TRANSLATION_BATCH_SIZE = 30
+TRANSLATION_MAX_IN_FLIGHT = 4 # Batches translated concurrently by translate_in_window
+TRANSLATION_REQUEST_RATE = 20.0 # Starting requests/s; high enough not to bind until the API throttles
+TRANSLATION_CACHE_MAX_ENTRIES = 200000
+# Placeholders written into results for words that could not be translated; never cached.
+TRANSLATION_ERROR_MARKERS = {"Item Error (No Text)", "Item Await Error", "Item Invalid", "Translator Re-init Err", "Translation Failed", "Critical Error"}
+
+
+class TranslationCache:
+    # Translations keyed by (normalized word, source, target, backend) in SQLite.
+    # last_used is a logical clock bumped on every lookup/store; when the table grows
+    # past max_entries the least recently used rows are deleted.
+    def __init__(self, db_path=None, max_entries=TRANSLATION_CACHE_MAX_ENTRIES):
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, "translations.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS translations (
+                word TEXT NOT NULL, source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, backend TEXT NOT NULL,
+                translation TEXT NOT NULL, last_used INTEGER NOT NULL,
+                UNIQUE (word, source_lang, target_lang, backend));
+            CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used);
+        """)
+        self._clock = self.conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM translations").fetchone()[0]
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    @staticmethod
+    def normalize(word):
+        return normalize_word(word)
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, words, source_lang, target_lang, backend):
+        # Returns {normalized word: translation} for the words that are cached.
+        keys = list(dict.fromkeys(self.normalize(word) for word in words))
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT word, translation FROM translations WHERE source_lang = ? AND target_lang = ? AND backend = ? AND word IN ({placeholders})",
+                (source_lang, target_lang, backend, *chunk)).fetchall()
+            found.update(rows)
+        if found:
+            now = self._tick()
+            self.conn.executemany(
+                "UPDATE translations SET last_used = ? WHERE word = ? AND source_lang = ? AND target_lang = ? AND backend = ?",
+                [(now, word, source_lang, target_lang, backend) for word in found])
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, pairs, source_lang, target_lang, backend):
+        rows = [(self.normalize(word), source_lang, target_lang, backend, translation)
+                for word, translation in pairs if translation and translation not in TRANSLATION_ERROR_MARKERS]
+        if not rows: return
+        now = self._tick()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO translations (word, source_lang, target_lang, backend, translation, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            [row + (now,) for row in rows])
+        self._entries += len(rows)
+        if self._entries > self.max_entries: self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = self._entries - self.max_entries
+        if excess <= 0: return
+        self.conn.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,))
+        self._entries -= excess
+        logging.info(f"Translation cache: evicted {excess} least recently used entries.")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self._entries, "max_entries": self.max_entries}
+
+    def close(self):
+        self.conn.close()
+
+
+class TranslationBackend:
+    # Interface used by BatchTranslator. translate() returns one string per word
+    # ("" for blanks, an error marker for failures) and reports usable translations
+    # through on_translated as soon as it has them.
+    name = "base"
+    cacheable = True # Whether results are worth keeping in the TranslationCache
+
+    async def translate(self, words_batch, target_lang_code, source_lang="auto", on_translated=None):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class BatchTranslator:
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or GoogleTranslateBackend()
+        self.cache = cache if self.backend.cacheable else None
+
+    async def translate_batch(self, words_batch, target_lang_code, source_lang="auto"):
+        if not self.backend or not words_batch:
+            return [""] * len(words_batch)
+        if self.cache is None:
+            return await self.backend.translate(words_batch, target_lang_code, source_lang)
+
+        # Only cache misses reach the backend; everything else is served locally.
+        backend_name = self.backend.name
+        words = [str(word) if word and str(word).strip() else "" for word in words_batch]
+        cached = self.cache.get_many([word for word in words if word], source_lang, target_lang_code, backend_name)
+        results = [cached.get(self.cache.normalize(word), "") if word else "" for word in words]
+        miss_indices = [i for i, word in enumerate(words) if word and self.cache.normalize(word) not in cached]
+        if miss_indices:
+            miss_words = [words[i] for i in miss_indices]
+            translated = await self.backend.translate(
+                miss_words, target_lang_code, source_lang,
+                on_translated=lambda pairs: self.cache.put_many(pairs, source_lang, target_lang_code, backend_name))
+            for i, translation in zip(miss_indices, translated):
+                results[i] = translation
+        return results
+
+    def stats(self):
+        stats = {"backend": self.backend.name, **self.backend.stats()}
+        if self.cache: stats["cache"] = self.cache.stats()
+        return stats
+
+
+class GoogleTranslateBackend(TranslationBackend):
+    name = "googletrans"
+
+    def __init__(self, rate_limiter=None, request_rate=TRANSLATION_REQUEST_RATE):
+        self.translator = Translator()
+        # One token per request (a whole batch); 429s halve the rate from there.
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(name="Translation API", rate=request_rate, burst=2 * TRANSLATION_MAX_IN_FLIGHT,
+                                                                max_rate=max(40.0, request_rate))
+
+    def stats(self):
+        return {"rate_limiter": self.rate_limiter.stats()}
+
+    async def _item_text(self, trans_obj, word):
+        # Returns (translation, None) for a usable item, else (None, error marker).
+        if inspect.iscoroutine(trans_obj): 
+            logging.warning(f"Individual item in batch result is a coroutine for '{word}'. Awaiting.")
+            try:
+                actual_item_result = await trans_obj
+            except Exception as e_await_item:
+                logging.error(f"Error awaiting individual item coroutine '{word}': {e_await_item}")
+                return None, "Item Await Error"
+            if hasattr(actual_item_result, 'text'):
+                return actual_item_result.text, None
+            logging.warning(f"Awaited item for '{word}' lacks .text. Type: {type(actual_item_result)}")
+            return None, "Item Error (No Text)"
+        if trans_obj and hasattr(trans_obj, 'text'):
+            return trans_obj.text, None
+        logging.warning(f"Batch translation item for '{word}' is problematic. Type: {type(trans_obj)}, Value: {trans_obj}")
+        return None, "Item Invalid"
+
+    async def translate(self, words_batch, target_lang_code, source_lang="auto", on_translated=None):
+        # Tracks every item separately: a retry only re-sends the items that are still
+        # failing, and each attempt's successes go to on_translated (the cache) at once.
+        translated_results = [""] * len(words_batch)
+        pending = [i for i, word in enumerate(words_batch) if word and str(word).strip()]
+
+        if not pending:
+            return translated_results
+
+        try:
+            for attempt in range(3):
+                try:
+                    pending_words = [str(words_batch[i]) for i in pending]
+                    logging.debug(f"Attempting batch translation for {len(pending_words)} words (attempt {attempt+1}).")
+                    
+                    await self.rate_limiter.acquire()
+                    translation_call_result = await asyncio.to_thread(
+                        self.translator.translate, pending_words, dest=target_lang_code
+                    )
+
+                    if inspect.iscoroutine(translation_call_result):
+                        logging.warning("asyncio.to_thread returned a coroutine for batch translate. Awaiting it.")
+                        translation_objs = await translation_call_result
+                    else:
+                        translation_objs = translation_call_result
+
+                    if not isinstance(translation_objs, list):
+                        logging.error(f"Batch translation (after potential await) did not return a list. Got: {type(translation_objs)}. Attempting re-init.")
+                        raise ValueError("Translator returned non-list for batch.")
+                    self.rate_limiter.on_success()
+
+                    still_failing = []
+                    translated_now = []
+                    for position, batch_idx in enumerate(pending):
+                        trans_obj = translation_objs[position] if position < len(translation_objs) else None
+                        text, error_marker = await self._item_text(trans_obj, pending_words[position])
+                        if text is None:
+                            translated_results[batch_idx] = error_marker
+                            still_failing.append(batch_idx)
+                        else:
+                            translated_results[batch_idx] = text
+                            translated_now.append((pending_words[position], text))
+                    if translated_now and on_translated:
+                        on_translated(translated_now)
+                    
+                    if not still_failing:
+                        return translated_results 
+                    logging.warning(f"{len(still_failing)} of {len(pending)} items failed in attempt {attempt+1}. Retrying only those.")
+                    pending = still_failing
+                    raise ValueError("Partial success in batch, retrying failed items.")
+
+                except (AttributeError, ValueError) as e_val_attr: 
+                    logging.warning(f"Error during batch processing (attempt {attempt+1}): {e_val_attr}. Re-initializing translator.")
+                    try:
+                        self.translator = Translator() 
+                    except Exception as e_init_trans:
+                        logging.error(f"Failed to re-initialize translator: {e_init_trans}")
+                        for batch_idx in pending: translated_results[batch_idx] = "Translator Re-init Err"
+                        return translated_results 
+                    await asyncio.sleep(1 * (attempt + 1)) 
+
+                except Exception as e_general: 
+                    logging.error(f"General batch translation error (attempt {attempt+1}) for '{target_lang_code}': {e_general}")
+                    if is_throttling_error(e_general):
+                        self.rate_limiter.on_throttled() # The shared bucket paces the retry
+                    else:
+                        await asyncio.sleep(1.5 * (attempt + 1))
+            
+            logging.error(f"All {attempt+1} translation attempts failed for {len(pending)} item(s) of a batch.")
+            for batch_idx in pending:
+                if not translated_results[batch_idx]: 
+                     translated_results[batch_idx] = "Translation Failed"
+            return translated_results
+
+        except Exception as e_outer: 
+            logging.critical(f"CRITICAL error in GoogleTranslateBackend.translate structure: {e_outer}", exc_info=True)
+            for batch_idx in pending:
+                translated_results[batch_idx] = "Critical Error"
+            return translated_results
+
+
+class LocalDictionaryBackend(TranslationBackend):
+    # Offline lookups in a bilingual word list (TSV or StarDict), through the
+    # memory-mapped index from offline_dictionary. The list fixes the language pair,
+    # so the requested languages are ignored. Words it lacks come back as "".
+    cacheable = False # A lookup is already cheaper than a cache hit
+
+    def __init__(self, dictionary_path):
+        self.index = open_dictionary(dictionary_path)
+        self.name = f"local:{os.path.basename(dictionary_path)}"
+        self.lookups = 0
+        self.found = 0
+
+    async def translate(self, words_batch, target_lang_code, source_lang="auto", on_translated=None):
+        results = [self.index.lookup(word) or "" if word and str(word).strip() else "" for word in words_batch]
+        self.lookups += sum(1 for word in words_batch if word and str(word).strip())
+        self.found += sum(1 for result in results if result)
+        if on_translated:
+            on_translated([(word, result) for word, result in zip(words_batch, results) if result])
+        return results
+
+    def stats(self):
+        return {"entries": len(self.index), "lookups": self.lookups, "found": self.found}
+
+
+async def translate_in_window(translate_batch, words, on_batch_ready, max_in_flight=TRANSLATION_MAX_IN_FLIGHT, batch_size=TRANSLATION_BATCH_SIZE):
+    # Sliding window over the batches: at most max_in_flight batches are started but
+    # not yet delivered. Batches that finish early wait in `ready` so that
+    # on_batch_ready(start_index, words_batch, translations) always sees them in order.
+    batch_starts = list(range(0, len(words), batch_size))
+    pending = {}
+    ready = {}
+    next_to_launch = 0
+    next_to_deliver = 0
+    try:
+        while next_to_deliver < len(batch_starts):
+            while next_to_launch < len(batch_starts) and next_to_launch - next_to_deliver < max(1, max_in_flight):
+                start = batch_starts[next_to_launch]
+                pending[next_to_launch] = asyncio.ensure_future(translate_batch(words[start:start + batch_size]))
+                next_to_launch += 1
+            done, _ = await asyncio.wait(pending.values(), return_when=asyncio.FIRST_COMPLETED)
+            for index in [index for index, task in pending.items() if task in done]:
+                ready[index] = pending.pop(index).result()
+            while next_to_deliver in ready:
+                start = batch_starts[next_to_deliver]
+                on_batch_ready(start, words[start:start + batch_size], ready.pop(next_to_deliver))
+                next_to_deliver += 1
+    finally:
+        for task in pending.values(): task.cancel()
+
+async def translate_words(translator, words, target_lang_code, source_lang="auto", max_in_flight=TRANSLATION_MAX_IN_FLIGHT):
+    translations = [""] * len(words)
+
+    async def translate_batch(words_batch):
+        return await translator.translate_batch(words_batch, target_lang_code, source_lang)
+
+    def collect(start, words_batch, translations_batch):
+        translations[start:start + len(words_batch)] = translations_batch
+
+    await translate_in_window(translate_batch, words, collect, max_in_flight)
+    return translations
@@ -0,0 +1,40 @@
+import time
+
+# Coalesces UI updates coming from the processing pipeline. Callers register an
+# update under a key ("rows", "progress", ...); registering the same key again
+# before the next flush replaces the earlier update, and all pending updates run
+# together at most once per frame. UI cost then follows frames, not batches.
+
+FRAME_INTERVAL_MS = 16
+
+
+class UIUpdateDispatcher:
+    def __init__(self, root, interval_ms=FRAME_INTERVAL_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._pending = {} # key -> callable, in first-registered order
+        self._job_id = None
+        self._last_flush = 0.0
+        self.flushes = 0
+
+    def schedule(self, key, update):
+        self._pending[key] = update
+        if self._job_id is None:
+            elapsed_ms = (time.monotonic() - self._last_flush) * 1000
+            self._job_id = self.root.after(max(0, int(self.interval_ms - elapsed_ms)), self.flush)
+
+    def flush(self):
+        # Also called directly when the latest state must be on screen now (end of a run).
+        if self._job_id is not None:
+            self.root.after_cancel(self._job_id)
+            self._job_id = None
+        pending, self._pending = self._pending, {}
+        for update in pending.values(): update()
+        self._last_flush = time.monotonic()
+        if pending: self.flushes += 1
+
+    def cancel(self):
+        if self._job_id is not None:
+            self.root.after_cancel(self._job_id)
+            self._job_id = None
+        self._pending.clear()
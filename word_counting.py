@@ -0,0 +1,254 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import asyncio
+import codecs
+import hashlib
+import heapq
+import multiprocessing
+import pickle
+import re
+import os
+import logging
+
+INPUT_LANGS = ["en", "ar", "de", "es", "fr", "it", "pt", "tr", "nl", "he", "ja", "ko", "ru", "zh-cn", "sv", "pl", "fi", "el", "hi", "id"]
+CJK_LANGS = ["zh-cn", "ja", "ko"]
+CJK_CHARS = r'\u2E80-\u2FFF\u3040-\u309F\u30A0-\u30FF\u31F0-\u31FF\u3200-\u32FF\u3400-\u4DBF\u4E00-\u9FFF\uAC00-\uD7AF\uF900-\uFAFF'
+CJK_TOKEN_PATTERN = re.compile(rf'[{CJK_CHARS}a-zA-Z0-9]+')
+WHITESPACE_TOKEN_PATTERN = re.compile(r'\S+') # Same tokens as re.split(r'\s+', text), minus the empty edges
+
+TOKENIZER_VERSION = 1 # Bump whenever the token rules change, so cached counts are invalidated
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".anki_dictionary_creator")
+
+READ_CHUNK_SIZE = 1 << 20 # Bytes per read; peak memory is one chunk plus the vocabulary
+RANGE_SPLIT_SIZE = 64 << 20 # Files above this are split into byte ranges that workers count separately
+PARALLEL_MIN_BYTES = 8 << 20 # Below this total input size a process pool costs more than it saves
+
+
+def _token_rules(lang_code):
+    if lang_code in CJK_LANGS:
+        return CJK_TOKEN_PATTERN, 1
+    return WHITESPACE_TOKEN_PATTERN, 2
+
+def _keep_token(word, min_len):
+    return len(word.strip()) >= min_len and not word.strip().isdigit()
+
+def iter_words(chunks, lang_code):
+    # A token touching the end of a chunk may continue in the next one, so it is
+    # carried over and only emitted once a separator (or the end of input) is seen.
+    pattern, min_len = _token_rules(lang_code)
+    carry = ""
+    for chunk in chunks:
+        if not chunk: continue
+        buffer = carry + chunk if carry else chunk
+        buffer_end = len(buffer)
+        carry = ""
+        for match in pattern.finditer(buffer):
+            if match.end() == buffer_end:
+                carry = match.group()
+                break
+            word = match.group()
+            if _keep_token(word, min_len):
+                yield word.lower()
+    if carry and _keep_token(carry, min_len):
+        yield carry.lower()
+
+def extract_words(text, lang_code):
+    logging.debug(f"Extracting words from text for language: {lang_code}")
+    words = list(iter_words([text], lang_code))
+    logging.debug(f"Extracted {len(words)} words. First few: {words[:10]}")
+    return words
+
+def iter_range_chunks(path, start, end, chunk_size=READ_CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = file.read(min(chunk_size, remaining))
+            if not data: break
+            remaining -= len(data)
+            yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+def count_file_range(path, lang_code, start, end, counts=None, chunk_size=READ_CHUNK_SIZE):
+    # Streams the range into the counter; no list of words is ever built.
+    if counts is None: counts = Counter()
+    counts.update(iter_words(iter_range_chunks(path, start, end, chunk_size), lang_code))
+    return counts
+
+def count_file_words(path, lang_code, counts=None, chunk_size=READ_CHUNK_SIZE):
+    return count_file_range(path, lang_code, 0, os.path.getsize(path), counts, chunk_size)
+
+def _next_line_start(file, offset, size, scan_size=1 << 16):
+    # Ranges are cut right after a newline: it is a separator for every tokenizer
+    # and never appears inside a multi-byte UTF-8 sequence.
+    file.seek(offset)
+    while offset < size:
+        block = file.read(scan_size)
+        if not block: break
+        newline_at = block.find(b"\n")
+        if newline_at != -1:
+            return offset + newline_at + 1
+        offset += len(block)
+    return size
+
+def plan_file_ranges(path, split_size=RANGE_SPLIT_SIZE):
+    size = os.path.getsize(path)
+    if size <= split_size:
+        return [(0, size)]
+    ranges = []
+    start = 0
+    with open(path, "rb") as file:
+        while start < size:
+            end = size if start + split_size >= size else _next_line_start(file, start + split_size, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _count_range_task(task):
+    path, lang_code, start, end = task
+    return path, count_file_range(path, lang_code, start, end)
+
+def _rank_key(item):
+    return -item[1], item[0] # Most frequent first, ties broken alphabetically
+
+def rank_words(word_counts, limit=0):
+    # Top-K selection is O(n log k); only an unlimited ranking pays for a full sort.
+    if limit and limit > 0:
+        return heapq.nsmallest(limit, word_counts.items(), key=_rank_key)
+    return sorted(word_counts.items(), key=_rank_key)
+
+
+class FrequencyIndexCache:
+    # One pickled Counter per (file, input language). The entry stores the stamp it
+    # was built from, so a changed file or tokenizer simply fails the comparison
+    # and the entry is overwritten on the next store.
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(DEFAULT_CACHE_DIR, "word_counts")
+
+    def stamp(self, path, lang_code):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, lang_code, TOKENIZER_VERSION)
+
+    def _entry_path(self, stamp):
+        key = f"{stamp[0]}\0{stamp[3]}".encode("utf-8")
+        return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest() + ".pickle")
+
+    def load(self, stamp):
+        try:
+            with open(self._entry_path(stamp), "rb") as file:
+                cached_stamp, counts = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable word count cache entry for '{stamp[0]}': {e}")
+            return None
+        return counts if cached_stamp == stamp else None
+
+    def store(self, stamp, counts):
+        entry_path = self._entry_path(stamp)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, "wb") as file:
+                pickle.dump((stamp, counts), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except Exception as e:
+            logging.warning(f"Could not write word count cache entry for '{stamp[0]}': {e}")
+            try: os.remove(temp_path)
+            except OSError: pass
+
+
+class WordCountEngine:
+    # Map-reduce counting: every file (or byte range of a large file) is counted
+    # by a worker process into a partial Counter, and the parent merges them.
+    def __init__(self, max_workers=None, split_size=RANGE_SPLIT_SIZE, parallel_min_bytes=PARALLEL_MIN_BYTES, cache=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache = cache
+        self.split_size = split_size
+        self.parallel_min_bytes = parallel_min_bytes
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, not fork: the GUI process already runs threads (asyncio executor, audio prefetch,
+            # SDL), and forking a threaded process can deadlock the workers.
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _plan(self, paths, lang_code):
+        tasks = []
+        cached = []
+        stamps = {}
+        total_bytes = 0
+        for path in paths:
+            if self.cache is not None:
+                stamps[path] = self.cache.stamp(path, lang_code)
+                counts = self.cache.load(stamps[path])
+                if counts is not None:
+                    cached.append((path, counts))
+                    continue
+            for start, end in plan_file_ranges(path, self.split_size):
+                tasks.append((path, lang_code, start, end))
+                total_bytes += end - start
+        use_pool = self.max_workers > 1 and len(tasks) > 1 and total_bytes >= self.parallel_min_bytes
+        return tasks, cached, stamps, use_pool
+
+    def _merger(self, paths, tasks, stamps, on_file_done, store=None):
+        ranges_left = Counter(task[0] for task in tasks)
+        file_counts = {}
+        total_counts = Counter()
+        files_done = [0]
+
+        def file_finished(path, counts, from_cache=False):
+            total_counts.update(counts)
+            if not from_cache and path in stamps:
+                (store or self.cache.store)(stamps[path], counts)
+            files_done[0] += 1
+            if on_file_done: on_file_done(path, files_done[0], len(paths))
+
+        def merge(path, partial_counts):
+            ranges_left[path] -= 1
+            counts = file_counts.pop(path, None)
+            if counts is None: counts = partial_counts
+            else: counts.update(partial_counts)
+            if ranges_left[path] > 0:
+                file_counts[path] = counts # Wait for the file's other ranges
+            else:
+                file_finished(path, counts)
+
+        return total_counts, merge, file_finished
+
+    def count_files(self, paths, lang_code, on_file_done=None):
+        tasks, cached, stamps, use_pool = self._plan(paths, lang_code)
+        total_counts, merge, file_finished = self._merger(paths, tasks, stamps, on_file_done)
+        for path, counts in cached: file_finished(path, counts, from_cache=True)
+        if not use_pool:
+            for task in tasks: merge(*_count_range_task(task))
+            return total_counts
+        executor = self._get_executor()
+        futures = [executor.submit(_count_range_task, task) for task in tasks]
+        for future in as_completed(futures):
+            merge(*future.result())
+        return total_counts
+
+    async def count_files_async(self, paths, lang_code, on_file_done=None):
+        # on_file_done runs on the event loop's thread, so it may touch the UI.
+        loop = asyncio.get_running_loop()
+        tasks, cached, stamps, use_pool = await asyncio.to_thread(self._plan, paths, lang_code)
+        cache_writes = []
+        def store_off_loop(stamp, counts): # Pickling a large Counter would stall the loop (and the UI)
+            cache_writes.append(loop.run_in_executor(None, self.cache.store, stamp, counts))
+        total_counts, merge, file_finished = self._merger(paths, tasks, stamps, on_file_done, store_off_loop)
+        for path, counts in cached: file_finished(path, counts, from_cache=True)
+        executor = self._get_executor() if use_pool else None # None = default thread pool, keeps the loop free
+        futures = [loop.run_in_executor(executor, _count_range_task, task) for task in tasks]
+        for future in asyncio.as_completed(futures):
+            merge(*(await future))
+        await asyncio.gather(*cache_writes)
+        return total_counts
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None